@@ -0,0 +1,268 @@
+import copy
+import functools
+import math
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Every BoundedCache registers itself here so cache_stats() can report on all of them
+_registry = {}
+
+_MISSING = object()
+
+
+def make_key(*parts, ndigits=6):
+    """
+    Canonical cache key: floats rounded to ndigits (~0.1 m at 6), everything else as-is.
+    """
+    return tuple(round(float(p), ndigits) if isinstance(p, float) else p for p in parts)
+
+
+def _sizeof(obj):
+    """Approximate size of a cached value: its pickled length, so nested JSON counts in full."""
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(obj)
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache with optional TTL and a cap in entries and/or bytes.
+    Keeps hit/miss/eviction/expiry counters; see stats(). Every instance
+    registers under its name, so cache_stats() and clear_caches() cover all
+    caches in the process.
+    """
+
+    def __init__(self, name, max_entries=None, max_bytes=None, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, stored_at, nbytes)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _registry[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live(key) is not _MISSING
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        if self.ttl is not None and time.time() - entry[1] >= self.ttl:
+            self._remove(key)
+            self.expirations += 1
+            return _MISSING
+        return entry[0]
+
+    def _remove(self, key):
+        _, _, nbytes = self._data.pop(key)
+        self._bytes -= nbytes
+        self._on_remove(key)
+
+    def _on_remove(self, key):
+        """Hook for subclasses keeping side indexes in sync."""
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._live(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, stored_at=None):
+        nbytes = _sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.time() if stored_at is None else stored_at, nbytes)
+            self._bytes += nbytes
+            while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key][0]
+            self._remove(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def items(self):
+        """Snapshot of (key, value, stored_at) for live entries, oldest first."""
+        with self._lock:
+            return [(k, v, ts) for k, (v, ts, _) in list(self._data.items()) if self._live(k) is not _MISSING]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes if self.max_bytes is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371000 * 2 * math.asin(math.sqrt(a))
+
+
+class SpatialCache(BoundedCache):
+    """
+    BoundedCache for (lat, lon, radius) keys that can answer a miss from an
+    entry already computed within tolerance_m meters with the same radius.
+    tolerance_m = 0 keeps exact-key behaviour; set_spatial_tolerance() changes it
+    on every SpatialCache at once. Approximate hits are counted separately and
+    their distances recorded (approx_distances keeps the most recent).
+    """
+
+    def __init__(self, name, tolerance_m=0.0, index_cell_m=25.0, max_entries=None, max_bytes=None, ttl=None):
+        super().__init__(name, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.tolerance_m = tolerance_m
+        self._cell_deg = index_cell_m / 111_320
+        self._grid = {}  # (radius, cell_lat, cell_lon) -> set of keys
+        self.approx_hits = 0
+        self.approx_distances = deque(maxlen=10_000)
+        self._approx_distance_sum = 0.0
+        self._approx_distance_max = 0.0
+
+    def _cell(self, key):
+        lat, lon, radius = key[0], key[1], key[2:]
+        return radius, math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg)
+
+    def _on_remove(self, key):
+        cell = self._grid.get(self._cell(key))
+        if cell is not None:
+            cell.discard(key)
+            if not cell:
+                del self._grid[self._cell(key)]
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            super().set(key, value, stored_at)
+            if key in self._data:
+                self._grid.setdefault(self._cell(key), set()).add(key)
+
+    def _nearest(self, key):
+        """Closest live key within tolerance_m with the same radius, as (key, distance_m)."""
+        lat, lon = key[0], key[1]
+        radius, ci, cj = self._cell(key)
+        n_lat = math.ceil(self.tolerance_m / 111_320 / self._cell_deg)
+        n_lon = math.ceil(n_lat / max(math.cos(math.radians(lat)), 1e-6))
+        best, best_d = None, None
+        for di in range(-n_lat, n_lat + 1):
+            for dj in range(-n_lon, n_lon + 1):
+                for k in self._grid.get((radius, ci + di, cj + dj), ()):
+                    d = _haversine_m(lat, lon, k[0], k[1])
+                    if d <= self.tolerance_m and (best_d is None or d < best_d):
+                        best, best_d = k, d
+        return best, best_d
+
+    def get_with_distance(self, key, default=None):
+        """Like get(), but returns (value, distance_m); distance is 0.0 for exact hits, None on a miss."""
+        with self._lock:
+            value = self._live(key)
+            distance = 0.0
+            if value is _MISSING and self.tolerance_m > 0:
+                near, distance = self._nearest(key)
+                value = self._live(near) if near is not None else _MISSING
+                if value is not _MISSING:
+                    key = near
+                    self.approx_hits += 1
+                    self.approx_distances.append(distance)
+                    self._approx_distance_sum += distance
+                    self._approx_distance_max = max(self._approx_distance_max, distance)
+            if value is _MISSING:
+                self.misses += 1
+                return default, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, distance
+
+    def get(self, key, default=None):
+        return self.get_with_distance(key, default)[0]
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "tolerance_m": self.tolerance_m,
+                "approx_hits": self.approx_hits,
+                "approx_distance_mean_m": self._approx_distance_sum / self.approx_hits if self.approx_hits else 0.0,
+                "approx_distance_max_m": self._approx_distance_max,
+            })
+        return stats
+
+
+def set_spatial_tolerance(tolerance_m):
+    """Set the approximate-hit tolerance (meters) on every registered SpatialCache."""
+    for cache in _registry.values():
+        if isinstance(cache, SpatialCache):
+            cache.tolerance_m = tolerance_m
+
+
+def memoize(cache, key=None, cacheable=None, copy_hits=False):
+    """
+    Decorator caching a function's results in a BoundedCache.
+    key(*args, **kwargs) builds the cache key; defaults to make_key over all arguments.
+    None results are cached too, unless cacheable(result) says otherwise.
+    copy_hits returns a deep copy of cached values so callers can't mutate the cache.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else make_key(*args, *sorted(kwargs.items()))
+            value = cache.get(k, _MISSING)
+            if value is not _MISSING:
+                return copy.deepcopy(value) if copy_hits else value
+            value = fn(*args, **kwargs)
+            if cacheable is None or cacheable(value):
+                cache.set(k, copy.deepcopy(value) if copy_hits else value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    """Counters for every registered cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_caches():
+    """Empty every registered cache (e.g. to time a cold run)."""
+    for cache in _registry.values():
+        cache.clear()
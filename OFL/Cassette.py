@@ -0,0 +1,193 @@
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import threading
+import time
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from OFL import Http
+from OFL.Files import atomic_write
+
+# Record/replay of external calls for deterministic offline runs.
+#
+# HTTP made through requests (Http.get, osmnx, geopy) is captured at
+# HTTPAdapter.send. Services reached another way (Earth Engine's own client,
+# DuckDB reading remote/local Parquet) are captured at the function boundaries
+# below: (module, attribute, number of leading args that identify the call).
+FUNCTION_BOUNDARIES = [
+    ("OFL.Helpers", "get_population_density_gee", 3),
+    ("OFL.Predictors.FoursquareQuery", "get_fsq_count", 3),
+    ("OFL.Predictors.Categories", "_fetch_foursquare_category", 3),
+]
+
+# Query parameters left out of HTTP keys (secrets, and values that differ per machine)
+IGNORED_PARAMS = {"key", "$$app_token", "token", "api_key"}
+_DROPPED_HEADERS = {"set-cookie", "date", "age", "expires", "content-encoding", "content-length", "transfer-encoding"}
+
+
+class CassetteMiss(requests.ConnectionError):
+    """Replay found no recording; raised like a network failure so callers' error handling applies."""
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def http_key(method, url, body=None):
+    parts = urllib.parse.urlsplit(url)
+    query = sorted((k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+                   if k not in IGNORED_PARAMS)
+    if isinstance(body, str):
+        body = body.encode()
+    body_hash = hashlib.sha256(body).hexdigest() if body else ""
+    return _digest(f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?{urllib.parse.urlencode(query)} {body_hash}")
+
+
+def call_key(name, args):
+    return _digest(f"{name}{json.dumps([round(a, 6) if isinstance(a, float) else a for a in args], default=repr)}")
+
+
+class Cassette:
+    """
+    mode="record": real calls run and their results are written under path.
+    mode="replay": results are served from path without network; anything not
+    recorded raises CassetteMiss.
+    latency: in replay, seconds slept per served call, or "recorded" to sleep the
+    time the call originally took (times latency_scale).
+
+        with Cassette("/data/cassettes/nyc", mode="replay", latency=0.05):
+            build_train_vars(...)
+    """
+
+    def __init__(self, path, mode="replay", latency=None, latency_scale=1.0, boundaries=FUNCTION_BOUNDARIES):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode must be 'record' or 'replay', got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.boundaries = boundaries
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._patches = []
+
+    # --- storage
+
+    def _file(self, kind, key):
+        return os.path.join(self.path, kind, key[:2], key)
+
+    def _write(self, kind, key, meta, payload):
+        base = self._file(kind, key)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        atomic_write(base + ".body", payload, "wb")
+        atomic_write(base + ".json", json.dumps(meta))
+        with self._lock:
+            self.recorded += 1
+
+    def _read(self, kind, key, what):
+        base = self._file(kind, key)
+        try:
+            with open(base + ".json") as f:
+                meta = json.load(f)
+            with open(base + ".body", "rb") as f:
+                payload = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            raise CassetteMiss(f"No recording for {what} in {self.path}") from None
+        with self._lock:
+            self.hits += 1
+        self._sleep(meta.get("elapsed", 0.0))
+        return meta, payload
+
+    def _sleep(self, elapsed):
+        if self.latency == "recorded":
+            time.sleep(elapsed * self.latency_scale)
+        elif self.latency:
+            time.sleep(self.latency)
+
+    # --- HTTP
+
+    def _send(self, original):
+        cassette = self
+
+        def send(adapter, request, **kwargs):
+            key = http_key(request.method, request.url, request.body)
+            if cassette.mode == "replay":
+                meta, body = cassette._read("http", key, f"{request.method} {request.url}")
+                resp = requests.Response()
+                resp.status_code = meta["status"]
+                resp.reason = meta.get("reason")
+                resp.headers = CaseInsensitiveDict(meta["headers"])
+                resp.encoding = meta.get("encoding")
+                resp._content = body
+                resp._content_consumed = True  # lets iter_content() stream the stored body
+                resp.url = request.url
+                resp.request = request
+                resp.connection = adapter
+                return resp
+
+            start = time.time()
+            resp = original(adapter, request, **kwargs)
+            body = resp.content  # reads streamed bodies too, so they can be replayed
+            # body is stored decoded, so transfer/encoding headers no longer apply
+            headers = {k: v for k, v in resp.headers.items() if k.lower() not in _DROPPED_HEADERS}
+            cassette._write("http", key, {"method": request.method, "url": resp.url, "status": resp.status_code,
+                                          "reason": resp.reason, "headers": headers, "encoding": resp.encoding,
+                                          "elapsed": time.time() - start}, body)
+            return resp
+
+        return send
+
+    # --- function boundaries
+
+    def _guard(self, name, fn, n_key_args):
+        cassette = self
+
+        def wrapper(*args, **kwargs):
+            key = call_key(name, list(args[:n_key_args]) + sorted(kwargs.items()))
+            if cassette.mode == "replay":
+                _, payload = cassette._read("calls", key, f"{name}{args[:n_key_args]}")
+                return pickle.loads(payload)
+            start = time.time()
+            value = fn(*args, **kwargs)
+            cassette._write("calls", key, {"name": name, "args": repr(args[:n_key_args]),
+                                           "elapsed": time.time() - start}, pickle.dumps(value))
+            return value
+
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    # --- activation
+
+    def _patch(self, owner, attr, value):
+        self._patches.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, value)
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._http_cache_dir = Http._config["cache_dir"]
+        Http.configure(cache_dir=None)  # conditional requests would make recordings depend on local cache state
+        self._patch(HTTPAdapter, "send", self._send(HTTPAdapter.send))
+        # likewise osmnx's own response cache would hide requests from the recording
+        self._patch(importlib.import_module("osmnx").settings, "use_cache", False)
+        for module_name, attr, n_key_args in self.boundaries:
+            module = importlib.import_module(module_name)
+            self._patch(module, attr, self._guard(f"{module_name}.{attr}", getattr(module, attr), n_key_args))
+        return self
+
+    def __exit__(self, *exc):
+        while self._patches:
+            owner, attr, value = self._patches.pop()
+            setattr(owner, attr, value)
+        Http.configure(cache_dir=self._http_cache_dir)
+        print(f'Cassette {self.mode} {self.path}: {self.stats()}')
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "recorded": self.recorded}
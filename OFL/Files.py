@@ -0,0 +1,22 @@
+import os
+import threading
+
+
+def atomic_write(path, data, mode="w", fsync=False):
+    """
+    Write data to path via a temp file renamed into place, so readers see the
+    old file or the new one, never a partial write. The temp name is unique per
+    process and thread; fsync=True also flushes it to disk before the rename.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode) as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
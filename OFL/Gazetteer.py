@@ -0,0 +1,143 @@
+import csv
+import os
+import numpy as np
+from OFL.Lazy import LazyModule
+
+spatial = LazyModule("scipy.spatial")
+
+# Bundled city/town/village centroids (name, place, admin1, lat, lon).
+# The shipped file covers the counties in CountyAdapters.COUNTY_ADAPTERS,
+# outlying towns included; elsewhere lookups fall back to Nominatim until a
+# full US file is built with build_gazetteer_from_geonames().
+_GAZETTEER_FILE = os.path.join(os.path.dirname(__file__), "data", "populated_places.csv")
+_EARTH_RADIUS_M = 6371000
+
+_gazetteer = None
+
+
+def _to_unit_xyz(lat, lon):
+    """Project lat/lon (degrees) onto the unit sphere so euclidean KD-tree distance orders like great-circle."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class Gazetteer:
+    """
+    Nearest populated place lookup over a KD-tree of place centroids.
+    """
+
+    def __init__(self, names, places, lats, lons):
+        self.names = np.asarray(names, dtype=object)
+        self.places = np.asarray(places, dtype=object)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self._tree = spatial.cKDTree(_to_unit_xyz(self.lats, self.lons))
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, lat, lon, max_distance_m=None):
+        """
+        Nearest place for a point or arrays of points.
+        Returns (idx, distance_m); idx is -1 where nothing lies within max_distance_m.
+        Scalars in -> scalars out, arrays in -> arrays out.
+        """
+        chord, idx = self._tree.query(_to_unit_xyz(lat, lon))
+        dist_m = 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * _EARTH_RADIUS_M
+        idx = np.asarray(idx)
+        if max_distance_m is not None:
+            idx = np.where(dist_m <= max_distance_m, idx, -1)
+        if idx.ndim == 0:
+            return int(idx), float(dist_m)
+        return idx, dist_m
+
+    def nearest_coords(self, lat, lon, max_distance_m=None):
+        """
+        (lat, lon) of the nearest place for a single point, or None if none is within max_distance_m.
+        For arrays, returns (lats, lons) with NaN where no place was found.
+        """
+        idx, _ = self.nearest(lat, lon, max_distance_m)
+        if np.ndim(idx) == 0:
+            if idx < 0:
+                return None
+            return float(self.lats[idx]), float(self.lons[idx])
+        found = idx >= 0
+        lats = np.where(found, self.lats[np.where(found, idx, 0)], np.nan)
+        lons = np.where(found, self.lons[np.where(found, idx, 0)], np.nan)
+        return lats, lons
+
+
+def load_gazetteer(path=_GAZETTEER_FILE):
+    """Read a gazetteer CSV (name, place, admin1, lat, lon)."""
+    names, places, lats, lons = [], [], [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            names.append(row["name"])
+            places.append(row["place"])
+            lats.append(float(row["lat"]))
+            lons.append(float(row["lon"]))
+    return Gazetteer(names, places, lats, lons)
+
+
+def get_gazetteer():
+    """Load the bundled gazetteer once per process; None if the file is missing or empty."""
+    global _gazetteer
+    if _gazetteer is None:
+        try:
+            _gazetteer = load_gazetteer()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Gazetteer unavailable: {e}")
+            _gazetteer = False
+        else:
+            if not len(_gazetteer):
+                _gazetteer = False
+    return _gazetteer or None
+
+
+def nearest_place_coords(lat, lon, max_distance_m=None):
+    """
+    Offline nearest city/town/village centroid. Accepts scalars or arrays.
+    Returns None (or NaNs for arrays) when the gazetteer is unavailable or nothing is close enough.
+    """
+    gaz = get_gazetteer()
+    if gaz is None:
+        if np.ndim(lat) == 0:
+            return None
+        nan = np.full(np.shape(lat), np.nan)
+        return nan, nan.copy()
+    return gaz.nearest_coords(lat, lon, max_distance_m)
+
+
+def build_gazetteer_from_geonames(geonames_txt, out_csv=_GAZETTEER_FILE, country_codes=("US",)):
+    """
+    Build the gazetteer CSV from a GeoNames dump (e.g. cities1000.txt from
+    https://download.geonames.org/export/dump/). Populated places are tagged
+    city (>= 100k people or an admin seat), town (>= 10k) or village.
+    """
+    rows = []
+    with open(geonames_txt, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15 or cols[6] != "P":
+                continue
+            if country_codes and cols[8] not in country_codes:
+                continue
+            population = int(cols[14] or 0)
+            if population >= 100_000 or cols[7] in ("PPLC", "PPLA", "PPLA2"):
+                place = "city"
+            elif population >= 10_000:
+                place = "town"
+            else:
+                place = "village"
+            rows.append([cols[1], place, cols[10], cols[4], cols[5]])
+
+    tmp = out_csv + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "place", "admin1", "lat", "lon"])
+        writer.writerows(rows)
+    os.replace(tmp, out_csv)
+    print(f"Wrote {len(rows)} places to {out_csv}")
+    return out_csv
@@ -1,31 +1,47 @@
-import duckdb
-import osmnx as ox
-import ee
 import requests
-from geopy.geocoders import Nominatim
+import math
+import os
+import threading
 import time
+from OFL import Gazetteer, Http
+from OFL.Cache import BoundedCache, SpatialCache, make_key, memoize
+from OFL.Lazy import LazyModule
 
-# Initialize Earth Engine
-# ee.Authenticate()
-# ee.Initialize(project='ee-shaddie77')
+# Heavy dependencies, imported when first used
+duckdb = LazyModule("duckdb")
+ox = LazyModule("osmnx")
+ee = LazyModule("ee")
+geocoders = LazyModule("geopy.geocoders")
 
-# # In-memory caches
-_geocode_cache = {}
-_pop_cache = {}
+# Earth Engine is initialized on first use (see ensure_ee), not at import
+EE_PROJECT = os.environ.get("OFL_EE_PROJECT", "ee-shaddie77")
+_ee_ready = False
+_ee_lock = threading.Lock()
+_default_duckdb_con = None
+_duckdb_lock = threading.Lock()
 
+# In-memory caches; the spatial ones are keyed by (lat, lon, radius)
+_geocode_cache = BoundedCache("helpers.nearest_place", max_entries=20_000, ttl=30 * 24 * 3600)
+_pop_cache = SpatialCache("helpers.population", max_entries=100_000)
+_osm_poi_cache = SpatialCache("helpers.osm_poi", max_entries=100_000)
+
+# Places farther than this from the local gazetteer fall back to Nominatim
+_GAZETTEER_MAX_DISTANCE_M = 25_000
 
 
 # Helper: robust cached geocoding
+@memoize(_geocode_cache)
 def get_nearest_place_coords(lat, lon):
     """
     Returns (lat, lon) of nearest city/town/village center.
-    Uses Nominatim reverse + forward geocoding, with caching + backoff.
+    Uses the local gazetteer first; falls back to Nominatim reverse + forward
+    geocoding, with caching + backoff, when no place is close enough.
     """
-    key = f"{lat:.5f}_{lon:.5f}"
-    if key in _geocode_cache:
-        return _geocode_cache[key]
+    coords = Gazetteer.nearest_place_coords(lat, lon, _GAZETTEER_MAX_DISTANCE_M)
+    if coords:
+        return coords
 
-    geolocator = Nominatim(user_agent="geo-fallback-app", timeout=10)
+    geolocator = geocoders.Nominatim(user_agent="geo-fallback-app", timeout=10)
 
     try:
         # Reverse lookup (lat, lon -> nearest place)
@@ -37,17 +53,15 @@ def get_nearest_place_coords(lat, lon):
                 # Forward geocode the place name to get its centroid
                 place_loc = geolocator.geocode(place)
                 if place_loc:
-                    coords = (place_loc.latitude, place_loc.longitude)
-                    _geocode_cache[key] = coords
-                    return coords
+                    return place_loc.latitude, place_loc.longitude
     except Exception as e:
         print(f"Geocoding fallback failed: {e}")
         time.sleep(2)  # backoff
 
-    _geocode_cache[key] = None
     return None
 
 
+@memoize(_pop_cache, key=lambda lat, lon, radius_m, *args, **kwargs: make_key(lat, lon, radius_m))
 def get_population_density_gee(lat, lon, radius_m, max_expand=3, expand_factor=2):
     """
     Get population density from WorldPop using Earth Engine.
@@ -55,12 +69,9 @@ def get_population_density_gee(lat, lon, radius_m, max_expand=3, expand_factor=2
     city/town center if still empty.
     Includes caching to avoid repeated queries.
     """
-    cache_key = f"{lat:.5f}_{lon:.5f}_{radius_m}"
-    if cache_key in _pop_cache:
-        return _pop_cache[cache_key]
-
     print(f"Getting population density at ({lat}, {lon}), radius={radius_m}m")
 
+    ensure_ee()
     dataset = ee.ImageCollection("WorldPop/GP/100m/pop") \
         .filter(ee.Filter.date('2020-01-01', '2020-12-31')) \
         .first()
@@ -82,7 +93,6 @@ def get_population_density_gee(lat, lon, radius_m, max_expand=3, expand_factor=2
             pop_val = result.get('population', None)
             if pop_val is not None:
                 print(f'Found pop_val {pop_val}')
-                _pop_cache[cache_key] = pop_val
                 return pop_val
             else:
                 print(f"No population data at radius {attempt_radius}m, expanding search...")
@@ -108,23 +118,23 @@ def get_population_density_gee(lat, lon, radius_m, max_expand=3, expand_factor=2
             pop_val = result.get('population', None)
             if pop_val is not None:
                 print(f'Found pop_val {pop_val}')
-                _pop_cache[cache_key] = pop_val
                 return pop_val
         except Exception as e:
             print(f"GEE fallback query failed: {e}")
 
     print("No population data found, even after fallback.")
-    _pop_cache[cache_key] = 0
     return 0
 
 # ----------------------------
 # POI Density (with fallback)
 # ----------------------------
+@memoize(_osm_poi_cache, key=lambda lat, lon, radius, *args, **kwargs: make_key(lat, lon, radius))
 def get_osm_poi_density(lat, lon, radius, max_expand=3, expand_factor=2):
     """
     Get POI density from OSM.
     Expands radius if no POIs found, and falls back to nearest
     town/city center if still empty.
+    Includes caching to avoid repeated queries.
     """
     print(f"Getting POI density at ({lat}, {lon}), radius={radius}m")
 
@@ -163,8 +173,13 @@ def get_osm_poi_density(lat, lon, radius, max_expand=3, expand_factor=2):
 def snap_to_nearest_town(lat, lon):
     """
     Snap (lat, lon) to nearest town/city center if available.
+    Uses the local gazetteer first, Nominatim only when no place is close enough.
     """
-    geolocator = Nominatim(user_agent="geo_fallback")
+    coords = Gazetteer.nearest_place_coords(lat, lon, _GAZETTEER_MAX_DISTANCE_M)
+    if coords:
+        return coords
+
+    geolocator = geocoders.Nominatim(user_agent="geo_fallback")
     try:
         location = geolocator.reverse((lat, lon), exactly_one=True, language="en")
         if location and "town" in location.raw["address"]:
@@ -193,7 +208,7 @@ def get_fips_from_coords(lat, lon, retries=3, wait=5):
     # Try FCC first with retry logic
     for attempt in range(retries):
         try:
-            resp = requests.get(fcc_url, params=params, timeout=5)
+            resp = Http.get(fcc_url, params=params, timeout=5)
             resp.raise_for_status()
             return resp.json()
         except requests.exceptions.RequestException as e:
@@ -214,7 +229,7 @@ def get_fips_from_coords(lat, lon, retries=3, wait=5):
         "format": "json"
     }
     try:
-        resp = requests.get(geocoder_url, params=params, timeout=5)
+        resp = Http.get(geocoder_url, params=params, timeout=5)
         resp.raise_for_status()
         data = resp.json()
 
@@ -230,10 +245,54 @@ def get_fips_from_coords(lat, lon, retries=3, wait=5):
         raise RuntimeError("Both FCC and Census Geocoder failed") from e
 
 
+def set_ee_project(project):
+    """Earth Engine project for ensure_ee; re-initializes on next use if it changed."""
+    global EE_PROJECT, _ee_ready
+    with _ee_lock:
+        if project != EE_PROJECT:
+            EE_PROJECT, _ee_ready = project, False
+
+
+def ensure_ee():
+    """Initialize Earth Engine once per process, authenticating only if there are no stored credentials."""
+    global _ee_ready
+    if _ee_ready:
+        return
+    with _ee_lock:
+        if _ee_ready:
+            return
+        try:
+            ee.Initialize(project=EE_PROJECT)
+        except ee.EEException:
+            # No stored credentials. Anything else (e.g. a network error) is raised rather than
+            # prompting, which would block headless workers and the Streamlit server.
+            ee.Authenticate()
+            ee.Initialize(project=EE_PROJECT)
+        _ee_ready = True
+        print(f'Google EE initialized (project {EE_PROJECT})')
+
+
 def _get_duckdb_connection(_fsq_duckdb_con):
     """Create and cache a DuckDB connection."""
     # global _fsq_duckdb_con
     if _fsq_duckdb_con is None:
         con = duckdb.connect()
         _fsq_duckdb_con = con
-    return _fsq_duckdb_con
\ No newline at end of file
+    return _fsq_duckdb_con
+
+
+def get_default_duckdb_connection():
+    """Process-wide DuckDB connection, opened on first use."""
+    global _default_duckdb_con
+    with _duckdb_lock:
+        if _default_duckdb_con is None:
+            _default_duckdb_con = duckdb.connect()
+        return _default_duckdb_con
+
+def tile_id(lat, lon, tile_m=1000):
+    """
+    Integer (row, col) of the ~tile_m square tile containing (lat, lon).
+    Used to keep spatially close candidates together (sharding, work queues, CV folds).
+    """
+    tile_deg = tile_m / 111_320
+    return int(math.floor(lat / tile_deg)), int(math.floor(lon / tile_deg))
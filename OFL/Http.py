@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+from OFL.Files import atomic_write
+
+# Shared HTTP client: one keep-alive session per host, a retry policy, and an
+# on-disk response cache revalidated with ETag / Last-Modified.
+_config = {
+    "retries": 3,
+    "backoff_factor": 0.5,
+    "status_forcelist": (429, 500, 502, 503, 504),
+    "pool_maxsize": 16,
+    "timeout": 30,
+    "cache_dir": os.environ.get("OFL_HTTP_CACHE_DIR", os.path.expanduser("~/.cache/ofl/http")),
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """
+    Override client settings (retries, backoff_factor, status_forcelist,
+    pool_maxsize, timeout, cache_dir). Set cache_dir=None to disable the disk cache.
+    Existing sessions are dropped so new settings apply to the next request.
+    """
+    unknown = set(kwargs) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown HTTP client settings: {sorted(unknown)}")
+    with _sessions_lock:
+        _config.update(kwargs)
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+
+
+def get_session(url):
+    """Keep-alive session for url's host, created on first use."""
+    host = urllib.parse.urlsplit(url)[:2]
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            retry = Retry(
+                total=_config["retries"],
+                backoff_factor=_config["backoff_factor"],
+                status_forcelist=_config["status_forcelist"],
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,  # callers still see the final status via raise_for_status()
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_config["pool_maxsize"], max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def _cache_paths(url, params):
+    query = urllib.parse.urlencode(sorted((params or {}).items()), doseq=True)
+    digest = hashlib.sha256(f"{url}?{query}".encode()).hexdigest()
+    base = os.path.join(_config["cache_dir"], digest[:2], digest)
+    return base + ".body", base + ".json"
+
+
+def _load_cached(url, params):
+    if not _config["cache_dir"]:
+        return None
+    body_path, meta_path = _cache_paths(url, params)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            return meta, f.read()
+    except (OSError, ValueError):
+        return None
+
+
+def _store(url, params, resp):
+    body_path, meta_path = _cache_paths(url, params)
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    meta = {
+        "url": resp.url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "headers": dict(resp.headers),
+        "encoding": resp.encoding,
+    }
+    # body first, then meta: a reader never sees meta pointing at a partial body
+    atomic_write(body_path, resp.content, "wb")
+    atomic_write(meta_path, json.dumps(meta))
+
+
+def _from_cache(resp, meta, body):
+    """Turn a 304 into the cached 200 response."""
+    cached = requests.Response()
+    cached.status_code = 200
+    cached.reason = "OK"
+    cached._content = body
+    cached.headers = CaseInsensitiveDict(meta["headers"])
+    cached.encoding = meta.get("encoding")
+    cached.url = meta.get("url") or resp.url
+    cached.request = resp.request
+    cached.from_cache = True
+    return cached
+
+
+def get(url, params=None, headers=None, timeout=None, use_cache=True, **kwargs):
+    """
+    GET through the shared pooled session for url's host.
+    When use_cache is on and a previous response carried an ETag or
+    Last-Modified, the request is sent conditionally and a 304 is answered
+    from the disk cache. Returns a requests.Response.
+    """
+    headers = dict(headers or {})
+    cached = _load_cached(url, params) if use_cache else None
+    if cached:
+        meta, _ = cached
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    resp = get_session(url).get(url, params=params, headers=headers,
+                                timeout=timeout or _config["timeout"], **kwargs)
+
+    if resp.status_code == 304 and cached:
+        return _from_cache(resp, *cached)
+
+    resp.from_cache = False
+    if (use_cache and _config["cache_dir"] and resp.status_code == 200 and not kwargs.get("stream")
+            and ("ETag" in resp.headers or "Last-Modified" in resp.headers)):
+        try:
+            _store(url, params, resp)
+        except OSError as e:
+            # non-fatal: caching failure shouldn't fail the request
+            print(f"HTTP cache write failed: {e}")
+    return resp
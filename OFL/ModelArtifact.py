@@ -0,0 +1,90 @@
+import io
+import json
+import numpy as np
+from OFL.Files import atomic_write
+
+# Small, sklearn-free linear model artifact: one .npz with float64 coef and
+# intercept arrays plus a JSON header (feature order, category vocab, metadata).
+# Loaded with allow_pickle=False, so it is plain data.
+ARTIFACT_VERSION = 1
+
+
+def linear_parameters(model):
+    """
+    (coef, intercept, feature_names) of a fitted linear model: a LinearRegression /
+    Ridge / Lasso, or a Pipeline of StandardScaler and one of those (the scaling is
+    folded into the coefficients). Raises ValueError for anything else.
+    """
+    scale, mean = None, None
+    if hasattr(model, "steps"):
+        *pre, (_, model) = model.steps
+        for _, step in pre:
+            if len(pre) > 1 or not hasattr(step, "scale_"):
+                raise ValueError(f"Cannot export pipeline step {step!r}")
+            scale = step.scale_ if step.with_std else np.ones_like(step.mean_)
+            mean = step.mean_ if step.with_mean else np.zeros_like(step.scale_)
+    if not hasattr(model, "coef_") or np.ndim(model.coef_) != 1:
+        raise ValueError(f"{type(model).__name__} is not a single-output linear model")
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    intercept = float(model.intercept_)
+    if scale is not None:
+        coef = coef / scale
+        intercept -= float(coef @ mean)
+    names = getattr(model, "feature_names_in_", None)
+    return coef, intercept, None if names is None else [str(n) for n in names]
+
+
+def artifact_bytes(coef, intercept, feature_names, vocab=None, meta=None):
+    header = {"version": ARTIFACT_VERSION, "feature_names": list(feature_names), "vocab": vocab or {},
+              "meta": meta or {}}
+    buf = io.BytesIO()
+    np.savez(buf, coef=np.asarray(coef, dtype=np.float64), intercept=np.float64(intercept),
+             header=np.frombuffer(json.dumps(header).encode(), dtype=np.uint8))
+    return buf.getvalue()
+
+
+def export_linear_model(model, path, feature_names=None, vocab=None, meta=None):
+    """Write model as an artifact at path (atomically). Returns path."""
+    coef, intercept, names = linear_parameters(model)
+    feature_names = feature_names or names
+    if feature_names is None or len(feature_names) != len(coef):
+        raise ValueError("feature_names must list one name per coefficient")
+    atomic_write(path, artifact_bytes(coef, intercept, feature_names, vocab, meta), "wb")
+    print(f'Exported model artifact ({len(coef)} features) to {path}')
+    return path
+
+
+def from_sklearn(model, feature_names=None, vocab=None, meta=None):
+    """LinearPredictor equivalent to a fitted sklearn linear model (see linear_parameters)."""
+    coef, intercept, names = linear_parameters(model)
+    return LinearPredictor(coef, intercept, feature_names or names, vocab, meta)
+
+
+class LinearPredictor:
+    """Scores a whole feature matrix with one dot product; needs only numpy."""
+
+    def __init__(self, coef, intercept, feature_names, vocab=None, meta=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.feature_names = list(feature_names)
+        self.vocab = vocab or {}
+        self.meta = meta or {}
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as z:
+            header = json.loads(z["header"].tobytes().decode())
+            if header.get("version") != ARTIFACT_VERSION:
+                raise ValueError(f"Unsupported model artifact version {header.get('version')}")
+            return cls(z["coef"], z["intercept"], header["feature_names"], header["vocab"], header["meta"])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def predict(self, X):
+        """X: DataFrame with the feature columns (any order), or an array already in feature order."""
+        if hasattr(X, "columns"):
+            X = X[self.feature_names].to_numpy(dtype=np.float64)
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
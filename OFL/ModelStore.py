@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from OFL import Http
+from OFL.Files import atomic_write
+
+_DEFAULT_ROOT = os.environ.get("OFL_MODEL_STORE", os.path.expanduser("~/.cache/ofl/models"))
+
+
+class ModelStore:
+    """
+    Local, content-addressed cache of downloaded model files.
+
+    objects/<sha256> holds each distinct file once; it is never modified after
+    it lands (written to a temp file and renamed into place), so any number of
+    processes can read and download concurrently. refs/<name>.json points a
+    name at an object, with the ETag / Last-Modified it was served with, so
+    fetch() revalidates with a conditional GET instead of downloading again,
+    and falls back to the last good object when the remote can't be reached.
+    """
+
+    def __init__(self, root=_DEFAULT_ROOT):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.refs_dir = os.path.join(root, "refs")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest)
+
+    def _ref_path(self, name):
+        return os.path.join(self.refs_dir, name.replace("/", "__") + ".json")
+
+    def get_ref(self, name):
+        """The ref for name, or None if missing or pointing at an object that isn't on disk."""
+        try:
+            with open(self._ref_path(name)) as f:
+                ref = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return ref if os.path.exists(self.object_path(ref["sha256"])) else None
+
+    def _set_ref(self, name, ref):
+        atomic_write(self._ref_path(name), json.dumps(ref), fsync=True)
+
+    def put_stream(self, chunks):
+        """Store the bytes of chunks; returns their sha256. Existing objects are not rewritten."""
+        h = hashlib.sha256()
+        tmp = os.path.join(self.objects_dir, f".incoming.{os.getpid()}.{threading.get_ident()}")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    h.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            digest = h.hexdigest()
+            if os.path.exists(self.object_path(digest)):
+                os.remove(tmp)
+            else:
+                os.replace(tmp, self.object_path(digest))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest
+
+    def put_bytes(self, data):
+        return self.put_stream([data])
+
+    def verify(self, digest):
+        h = hashlib.sha256()
+        with open(self.object_path(digest), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest() == digest
+
+    def fetch(self, name, url, timeout=30):
+        """
+        Path of the current file for name, downloaded from url only when it changed.
+        Network errors and 5xx answers fall back to the last good version when there is one;
+        a 4xx (moved, private or deleted model) is raised, as is any error with nothing cached.
+        """
+        ref = self.get_ref(name)
+        headers = {}
+        if ref and ref.get("url") == url:
+            if ref.get("etag"):
+                headers["If-None-Match"] = ref["etag"]
+            if ref.get("last_modified"):
+                headers["If-Modified-Since"] = ref["last_modified"]
+
+        try:
+            resp = Http.get(url, headers=headers, timeout=timeout, use_cache=False, stream=True)
+            if resp.status_code == 304 and ref:
+                resp.close()
+                print(f'Model {name} unchanged ({ref["sha256"][:12]})')
+                return self.object_path(ref["sha256"])
+            resp.raise_for_status()
+            with resp:
+                digest = self.put_stream(resp.iter_content(chunk_size=1 << 20))
+        except requests.RequestException as e:
+            client_error = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code < 500
+            if ref and not client_error:
+                print(f'Model {name}: remote unavailable ({e}); using last good version {ref["sha256"][:12]}')
+                return self.object_path(ref["sha256"])
+            raise
+
+        self._set_ref(name, {"sha256": digest, "url": url, "etag": resp.headers.get("ETag"),
+                             "last_modified": resp.headers.get("Last-Modified"), "fetched_at": time.time()})
+        print(f'Model {name} updated to {digest[:12]}')
+        return self.object_path(digest)
+
+    def prune(self):
+        """Delete objects no ref points to. Returns the number removed."""
+        live = set()
+        for fname in os.listdir(self.refs_dir):
+            if fname.endswith(".json"):
+                ref = self.get_ref(fname[:-5])
+                if ref:
+                    live.add(ref["sha256"])
+        removed = 0
+        for fname in os.listdir(self.objects_dir):
+            if fname not in live and not fname.startswith(".incoming."):
+                os.remove(self.object_path(fname))
+                removed += 1
+        return removed
@@ -1,10 +1,18 @@
-from sklearn.preprocessing import LabelEncoder
-import duckdb
-import osmnx as ox
 import time, requests
-from OFL.Helpers import snap_to_nearest_town
+from OFL.Helpers import snap_to_nearest_town, duckdb, ox
+from OFL import Http
 
-def encode_location_categories(df):
+CATEGORY_COLUMNS = {"location_category_foursquare": "fsq_category_encoded",
+                    "location_category_osm": "osm_category_encoded"}
+
+
+def category_vocab(df):
+    """Sorted distinct labels per category column; a label's code is its position (as LabelEncoder assigns)."""
+    return {col: sorted(df[col].fillna("unknown").astype(str).unique()) if col in df else ["unknown"]
+            for col in CATEGORY_COLUMNS}
+
+
+def encode_location_categories(df, vocab=None):
     """
     Encode Foursquare + OSM category labels into numeric values
     so they can be used as regression features.
@@ -12,30 +20,24 @@ def encode_location_categories(df):
     Expects df with columns:
         - location_category_foursquare
         - location_category_osm
+    vocab: optional {column: [labels]} saved with a trained model, so inference
+    uses the training codes. Labels it doesn't know get the code of "unknown"
+    (0 if the vocab has none). Without it the codes are fitted on df.
     Returns the same df with numeric-encoded columns added.
     """
-    # shared encoders so model always uses the same mapping
-    _fsq_encoder = LabelEncoder()
-    _osm_encoder = LabelEncoder()
-
-    global _encoders_fitted
-    _encoders_fitted = False
-
     # Ensure columns exist, replace None with "unknown"
-    for col in ["location_category_foursquare", "location_category_osm"]:
+    for col in CATEGORY_COLUMNS:
         if col not in df:
             df[col] = "unknown"
-        df[col] = df[col].fillna("unknown")
+        df[col] = df[col].fillna("unknown").astype(str)
 
-    # Fit encoders once on all available categories
-    if not _encoders_fitted:
-        _fsq_encoder.fit(df["location_category_foursquare"].unique())
-        _osm_encoder.fit(df["location_category_osm"].unique())
-        _encoders_fitted = True
+    if vocab is None:
+        vocab = category_vocab(df)
 
     # Transform into numeric codes
-    df["fsq_category_encoded"] = _fsq_encoder.transform(df["location_category_foursquare"])
-    df["osm_category_encoded"] = _osm_encoder.transform(df["location_category_osm"])
+    for col, encoded in CATEGORY_COLUMNS.items():
+        codes = {label: i for i, label in enumerate(vocab[col])}
+        df[encoded] = df[col].map(codes).fillna(codes.get("unknown", 0)).astype("int64")
 
     return df
 
@@ -72,7 +74,7 @@ def _fetch_foursquare_category(lat, lon, radius, max_radius=5000):
     try:
         # Load parquet metadata
         api_url = "https://datasets-server.huggingface.co/parquet?dataset=foursquare/fsq-os-places"
-        j = requests.get(api_url).json()
+        j = Http.get(api_url).json()
         parquet_urls = [f['url'] for f in j.get('parquet_files', []) if f['split'] == 'train']
 
         if not parquet_urls:
@@ -1,9 +1,12 @@
 import os
-import duckdb
 import hashlib
+from OFL.Cache import SpatialCache, make_key
+from OFL import Helpers
 
 # Globals / caches
 # _fsq_query_cache = {}
+# Default count cache when callers don't bring their own, keyed by (lat, lon, radius)
+_fsq_count_cache = SpatialCache("fsq.counts", max_entries=200_000)
 # _fsq_duckdb_con = None
 _fsq_local_file = None
 _coord_columns_cache = {}  # cache which pair of coordinate cols works
@@ -29,7 +32,6 @@ def _ensure_local_parquet(local_path="//Users//rckyi//Documents//Data//fsq_place
 #     return _fsq_duckdb_con
 
 
-import duckdb
 import hashlib
 import os
 
@@ -58,15 +60,24 @@ def get_fsq_count(lat, lon, r, _fsq_query_cache, _fsq_duckdb_con
     """
     Count FSQ places within radius r (meters) of lat/lon.
     Uses local parquet + cache to avoid repeated requests.
+    _fsq_query_cache is a BoundedCache/SpatialCache; None uses the module default.
+    _fsq_duckdb_con: None uses the process-wide connection, opened on first use.
     """
+    if _fsq_query_cache is None:
+        _fsq_query_cache = _fsq_count_cache
+
     # Cache key
-    key = hashlib.md5(f"{lat:.6f}_{lon:.6f}_{r}".encode()).hexdigest()
-    if key in _fsq_query_cache:
-        print(f'_fsq_query_cache[key] {_fsq_query_cache[key]}')
-        return _fsq_query_cache[key]
+    key = make_key(lat, lon, r)
+    cached = _fsq_query_cache.get(key)
+    if cached is not None:
+        print(f'_fsq_query_cache[key] {cached}')
+        return cached
 
     print("Getting Foursquare Count")
 
+    if _fsq_duckdb_con is None:
+        _fsq_duckdb_con = Helpers.get_default_duckdb_connection()
+
     # Auto-detect lat/lon columns
     lat_col, lon_col = _detect_lat_lon_columns(local_file, _fsq_duckdb_con)
     print(f"✅ Using columns: {lat_col}, {lon_col}")
@@ -86,7 +97,7 @@ def get_fsq_count(lat, lon, r, _fsq_query_cache, _fsq_duckdb_con
     res = _fsq_duckdb_con.execute(query).fetchdf()
     count = int(res['count'][0]) if res.shape[0] else 0
 
-    _fsq_query_cache[key] = count
+    _fsq_query_cache.set(key, count)
     print(f'fsq count {count}')
     return count
 
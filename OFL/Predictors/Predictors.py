@@ -1,43 +1,49 @@
 import numpy as np
 from OFL.Predictors.Categories import get_osm_category, get_foursquare_category
 from OFL.Predictors import FoursquareQuery
-from OFL import Helpers
-import osmnx as ox
+from OFL import Helpers, Http
+from OFL.Helpers import ox
+from OFL.Lazy import LazyModule
 import pandas as pd
-from shapely.geometry import Point
 from math import radians, cos, sin, asin, sqrt
 import time, requests
 import os
 import hashlib
 
+geometry = LazyModule("shapely.geometry")
 
-def generate_city_candidate_locations(location_name, radius_c):
+
+def city_polygon(location_name):
     # Use OSMnx to get city polygon
-    print(f'Generating candidate locations ...')
     gdf = ox.geocode_to_gdf(location_name)
-    city_poly = gdf.geometry.iloc[0]
-    bounds = city_poly.bounds
+    return gdf.geometry.iloc[0]
 
-    print(f'City bounds {bounds}')
 
-    step = radius_c * 1.5 * 50
+def grid_points(city_poly, step, bounds=None):
+    """(lat, lon) points every step meters over bounds (default: the polygon's) that fall inside city_poly."""
+    bounds = bounds or city_poly.bounds
     deg_step = step / 111_320
 
     print(f'size of generate city loop for deg_step {deg_step}: {len(np.arange(bounds[1], bounds[3], deg_step))}')
     candidates = []
-    count = 0
     for lat in np.arange(bounds[1], bounds[3], deg_step):
         for lon in np.arange(bounds[0], bounds[2], deg_step):
             # Create a Shapely Point object
-            p = Point(lon, lat)
+            p = geometry.Point(lon, lat)
             if city_poly.contains(p):
                 candidates.append((lat, lon))
-        # print(f'current count of generate city loop: {count}')
-        count += 1
-    # print(f'Candidates {candidates}')
     return candidates
 
 
+def generate_city_candidate_locations(location_name, radius_c):
+    print(f'Generating candidate locations ...')
+    city_poly = city_polygon(location_name)
+    print(f'City bounds {city_poly.bounds}')
+
+    step = radius_c * 1.5 * 50
+    return grid_points(city_poly, step)
+
+
 def get_median_income_by_point(lat, lon, radius, CENSUS_API_KEY):
     # TODO: Replace with buffered multi-tract ACS query
     print(f'Getting median_income ...')
@@ -61,7 +67,7 @@ def get_median_income_by_point(lat, lon, radius, CENSUS_API_KEY):
         "https://api.census.gov/data/2022/acs/acs5"
         f"?get=B19013_001E&for=tract:{tract_fips}&in=state:{state_fips}%20county:{county_fips}&key={CENSUS_API_KEY}"
     )
-    r2 = requests.get(acs_url, headers=headers, timeout=50)
+    r2 = Http.get(acs_url, headers=headers, timeout=50)
     r2.raise_for_status()
     arr = r2.json()
     if len(arr) < 2:
@@ -148,14 +154,14 @@ def _ensure_local_parquet():
     print("📥 Downloading FSQ parquet file from Hugging Face...")
 
     # Step 1: Fetch metadata once
-    j = requests.get(FSQ_DATASET_META, timeout=15).json()
+    j = Http.get(FSQ_DATASET_META, timeout=15).json()
     parquet_urls = [f['url'] for f in j.get('parquet_files', []) if f['split'] == 'train']
     if not parquet_urls:
         raise RuntimeError("No parquet URLs found for Foursquare dataset")
     remote_url = parquet_urls[0]
 
     # Step 2: Stream download
-    with requests.get(remote_url, stream=True, timeout=60) as r:
+    with Http.get(remote_url, stream=True, timeout=60) as r:
         r.raise_for_status()
         with open(FSQ_LOCAL_FILE, "wb") as f:
             for chunk in r.iter_content(chunk_size=8192):
@@ -232,7 +238,7 @@ def build_features_for_location(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_qu
     for (lat_i, lon_i) in neighborhood_points:
         pop = Helpers.get_population_density_gee(lat_i, lon_i, cr)
         osm_poi = Helpers.get_osm_poi_density(lat_i, lon_i, cr)
-        fsq_poi = FoursquareQuery.get_fsq_count(lat_i, lon_i, cr, _fsq_duckdb_con, _fsq_query_cache)
+        fsq_poi = FoursquareQuery.get_fsq_count(lat_i, lon_i, cr, _fsq_query_cache, _fsq_duckdb_con)
         income = get_median_income_by_point(lat_i, lon_i, cr, CENSUS_API_KEY)
         osm_cat = get_osm_category(lat, lon)
         fsq_cat = get_foursquare_category(lat, lon)
@@ -0,0 +1,143 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from OFL.Lazy import LazyModule
+from OFL.ModelArtifact import LinearPredictor
+from OFL.Predictors import Predictors
+from OFL.Runners.Ranking import score_candidates
+
+geometry = LazyModule("shapely.geometry")
+
+_DEG_M = 111_320  # meters per degree, as in Predictors.grid_points
+
+
+def model_scorer(model, radius_m=100, cr=10, census_api_key="", max_workers=4, _fsq_duckdb_con=None,
+                 _fsq_query_cache=None):
+    """score_fn(points) -> {point: predicted revenue} using the full features (failed points are left out)."""
+    def score(points):
+        scored = score_candidates(points, model, radius_m, cr, census_api_key, max_workers, _fsq_duckdb_con,
+                                  _fsq_query_cache)
+        return dict(zip(zip(scored["lat"], scored["lon"]), scored["estimated_revenue"]))
+    return score
+
+
+def _key(point):
+    # Refined grids revisit coarse points up to float noise
+    return round(float(point[0]), 7), round(float(point[1]), 7)
+
+
+def refine(city_poly, point, step, factor):
+    """Points of a grid step / factor apart covering the cell of a coarse point (step apart), inside city_poly."""
+    child = step / factor / _DEG_M
+    offsets = child * np.arange(-(factor - 1), factor)
+    return [(point[0] + dlat, point[1] + dlon) for dlat in offsets for dlon in offsets
+            if city_poly.contains(geometry.Point(point[1] + dlon, point[0] + dlat))]
+
+
+def adaptive_search(city_poly, score_fn, budget, fine_step, factor=3, levels=2, keep=5):
+    """
+    Coarse-to-fine search for the highest-scoring point in city_poly.
+    Scores a grid factor**levels times coarser than fine_step, then repeatedly
+    refines the cells of the keep best points found so far with factor times
+    finer spacing, down to fine_step. Stops when budget feature evaluations
+    are spent (a coarse grid larger than the budget is thinned evenly to
+    half of it, leaving the rest for refinement).
+    Returns (best point, best score, evaluations, per-level history).
+    """
+    scores = {}
+    history = []
+
+    def evaluate(points):
+        new = list({_key(p): p for p in points if _key(p) not in scores}.values())
+        new = new[:budget - len(scores)]
+        if new:
+            for p, s in score_fn(new).items():
+                scores[_key(p)] = s
+            # Failed points still spent an evaluation; keep them out of the ranking
+            for p in new:
+                scores.setdefault(_key(p), np.nan)
+        return len(new)
+
+    step = fine_step * factor ** levels
+    coarse = Predictors.grid_points(city_poly, step)
+    if len(coarse) > budget:
+        coarse = [coarse[i] for i in np.linspace(0, len(coarse) - 1, budget // 2 or 1).astype(int)]
+    start = time.time()
+    n = evaluate(coarse)
+    history.append({"level": 0, "step_m": step, "evaluated": n, "total": len(scores)})
+
+    level = 0
+    while step > fine_step and len(scores) < budget:
+        level += 1
+        ranked = sorted(((s, p) for p, s in scores.items() if not np.isnan(s)), reverse=True)[:keep]
+        # Best cells first, so a budget cut-off drops the least promising refinements
+        children = [c for _, p in ranked for c in refine(city_poly, p, step, factor)]
+        step /= factor
+        n = evaluate(children)
+        history.append({"level": level, "step_m": step, "evaluated": n, "total": len(scores)})
+
+    valid = {p: s for p, s in scores.items() if not np.isnan(s)}
+    best = max(valid, key=valid.get) if valid else None
+    print(f'Adaptive search: {len(scores)} evaluations in {time.time() - start:.1f}s, '
+          f'best {best} = {valid.get(best, np.nan):.1f}')
+    return best, valid.get(best, np.nan), len(scores), pd.DataFrame(history)
+
+
+def compare_with_exhaustive(city_poly, score_fn, budget, fine_step, factor=3, levels=2, keep=5):
+    """Adaptive search vs scoring every point of the fine_step grid. Returns one report row."""
+    best, best_score, evals, _ = adaptive_search(city_poly, score_fn, budget, fine_step, factor, levels, keep)
+    start = time.time()
+    grid = Predictors.grid_points(city_poly, fine_step)
+    full = score_fn(grid)
+    exhaustive_s = time.time() - start
+    values = np.array(list(full.values()), dtype=np.float64)
+    opt = float(values.max()) if len(values) else np.nan
+    return {"evaluations": evals, "exhaustive_evaluations": len(grid), "best_score": best_score,
+            "exhaustive_best": opt, "gap_pct": 100 * (opt - best_score) / abs(opt) if opt else np.nan,
+            # share of the exhaustive grid the adaptive optimum beats or ties
+            "percentile": float(100 * np.mean(values <= best_score)) if len(values) else np.nan,
+            "best_lat": best[0] if best else np.nan, "best_lon": best[1] if best else np.nan,
+            "exhaustive_seconds": exhaustive_s}
+
+
+def main(argv=None):
+    """
+    Adaptive search for the best site of each city, optionally compared with the exhaustive grid.
+        python -m OFL.Runners.AdaptiveSearch "Hoboken, NJ" "Jersey City, NJ" --budget 200 --compare
+    """
+    import streamlit as st
+    parser = argparse.ArgumentParser(description="Coarse-to-fine search for the revenue maximum of a city")
+    parser.add_argument("cities", nargs="+")
+    parser.add_argument("--budget", type=int, default=200, help="max feature evaluations per city")
+    parser.add_argument("--radius-c", type=float, default=50,
+                        help="candidate facility radius; the finest spacing matches generate_city_candidate_locations")
+    parser.add_argument("--factor", type=int, default=3, help="spacing reduction per level")
+    parser.add_argument("--levels", type=int, default=2, help="refinement levels below the coarse grid")
+    parser.add_argument("--keep", type=int, default=5, help="best points refined per level")
+    parser.add_argument("--radius-m", type=float, default=100, help="neighborhood radius")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--compare", action="store_true", help="also score the full grid and report the gap")
+    parser.add_argument("--model", default="/Users/rckyi/Documents/Data/linear_regression_model.npz")
+    args = parser.parse_args(argv)
+
+    score_fn = model_scorer(LinearPredictor.load(args.model), args.radius_m,
+                            census_api_key=st.secrets.get("CENSUS_API_KEY", ""), max_workers=args.workers)
+    fine_step = args.radius_c * 1.5 * 50
+    rows = []
+    for city in args.cities:
+        poly = Predictors.city_polygon(city)
+        if args.compare:
+            row = compare_with_exhaustive(poly, score_fn, args.budget, fine_step, args.factor, args.levels, args.keep)
+        else:
+            best, score, evals, history = adaptive_search(poly, score_fn, args.budget, fine_step, args.factor,
+                                                          args.levels, args.keep)
+            print(history.to_string(index=False))
+            row = {"evaluations": evals, "best_score": score, "best_lat": best[0] if best else np.nan,
+                   "best_lon": best[1] if best else np.nan}
+        rows.append({"city": city, **row})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
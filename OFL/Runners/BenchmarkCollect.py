@@ -0,0 +1,64 @@
+import argparse
+import time
+import streamlit as st
+from OFL.Cassette import Cassette
+from OFL.Cache import cache_stats, clear_caches, set_spatial_tolerance
+from OFL.Predictors import FoursquareQuery
+from OFL.Predictors.Predictors import generate_circle_points
+from OFL.Runners.CollectData import build_train_vars
+
+
+def benchmark_candidates(lat, lon, radius_m, n):
+    """Fixed, reproducible candidate set: up to n grid points within radius_m of (lat, lon)."""
+    return generate_circle_points(lat, lon, radius_m, n)[:n]
+
+
+def run(candidates, cassette_dir, mode, latency=None, repeat=1, radius_m=100, cr=10, spatial_tolerance_m=0,
+        census_api_key=""):
+    """
+    End-to-end build_train_vars over candidates with every external call going
+    through a cassette. Record once online, then replay anywhere offline.
+    Each repeat starts from empty in-process caches. Returns per-repeat stats.
+    """
+    set_spatial_tolerance(spatial_tolerance_m)
+    con = None  # opened on first FSQ count; never in replay, where the cassette serves them
+    results = []
+    for i in range(repeat):
+        clear_caches()
+        with Cassette(cassette_dir, mode=mode, latency=latency) as cassette:
+            start = time.time()
+            rows = build_train_vars(candidates, radius_m, cr, census_api_key, con, FoursquareQuery._fsq_count_cache)
+            seconds = time.time() - start
+        res = {"repeat": i, "candidates": len(candidates), "rows": len(rows), "seconds": seconds,
+               "candidates_per_min": 60 * len(candidates) / seconds if seconds else 0.0, **cassette.stats()}
+        print(f"Run {i}: {res}")
+        results.append(res)
+    return results
+
+
+def main(argv=None):
+    """
+    Reproducible build_train_vars benchmark.
+        python -m OFL.Runners.BenchmarkCollect --cassette /tmp/nyc --mode record
+        python -m OFL.Runners.BenchmarkCollect --cassette /tmp/nyc --mode replay --latency recorded
+    """
+    parser = argparse.ArgumentParser(description="Benchmark build_train_vars against recorded external responses")
+    parser.add_argument("--cassette", required=True, help="directory holding the recordings")
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--latency", default=None,
+                        help="replay delay per call: seconds, or 'recorded' for the originally observed times")
+    parser.add_argument("--lat", type=float, default=40.7580)  # Times Square
+    parser.add_argument("--lon", type=float, default=-73.9855)
+    parser.add_argument("--n", type=int, default=10, help="number of candidates")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    latency = args.latency if args.latency in (None, "recorded") else float(args.latency)
+    candidates = benchmark_candidates(args.lat, args.lon, 500, args.n)
+    run(candidates, args.cassette, args.mode, latency=latency, repeat=args.repeat,
+        census_api_key=st.secrets.get("CENSUS_API_KEY", ""))
+    print(f'Cache stats {cache_stats()}')
+
+
+if __name__ == "__main__":
+    main()
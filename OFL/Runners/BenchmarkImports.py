@@ -0,0 +1,73 @@
+import argparse
+import re
+import subprocess
+import sys
+
+# Entry points whose cold import time we track
+MODULES = [
+    "OFL.Helpers",
+    "OFL.Predictors.Predictors",
+    "OFL.Runners.Inference",
+    "OFL.Runners.Train",
+    "OFL.Runners.CollectData",
+    "OFL.Runners.InferenceApp",
+]
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _importtime(statement):
+    """(cumulative_us, depth, name) for every module imported while running statement."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed: {proc.stderr.strip().splitlines()[-1]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((int(m.group(2)), (len(m.group(3)) - 1) // 2, m.group(4)))
+    return rows
+
+
+def import_profile(module):
+    """
+    Import module in a fresh interpreter under -X importtime.
+    Returns (total_us, {package: cumulative_us}): the total leaves out what the
+    interpreter imports at startup anyway; the breakdown covers third-party
+    and stdlib packages, each counted where it was first imported.
+    """
+    startup = {name for _, _, name in _importtime("pass")}
+    rows = [r for r in _importtime(f"import {module}") if r[2] not in startup]
+    total = sum(us for us, depth, _ in rows if depth == 0)
+    packages = {}
+    for us, _, name in rows:
+        if "." not in name and name != "OFL":
+            packages[name] = max(packages.get(name, 0), us)
+    return total, packages
+
+
+def main(argv=None):
+    """
+    Cold-start import cost of each entry point, measured with python -X importtime.
+        python -m OFL.Runners.BenchmarkImports --top 8
+    """
+    parser = argparse.ArgumentParser(description="Measure cold import time of OFL entry points")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--top", type=int, default=5, help="heaviest packages to list per module")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module (the fastest is reported)")
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        try:
+            runs = [import_profile(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module}: {e}")
+            continue
+        total, packages = min(runs, key=lambda r: r[0])
+        print(f"{module}: {total / 1000:.0f} ms")
+        for name, us in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import csv
+import os
+import pandas as pd
+
+# Columns of the collected training rows, in file order
+TRAIN_COLUMNS = ["city", "lat", "lon", "population_density", "osm_poi_density", "fsq_poi_count",
+                 "median_income", "revenue"]
+
+
+def candidate_key(lat, lon):
+    return f"{lat:.6f},{lon:.6f}"
+
+
+def _fsync_append(path, text):
+    with open(path, "a", newline="") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class CollectionCheckpoint:
+    """
+    Durable, resumable output for build_train_vars.
+
+    Rows are appended to <out_dir>/rows.csv in batches; once a batch is on
+    disk, the keys of every candidate it covers (labeled or not) are appended
+    to <out_dir>/manifest.txt. On restart, candidates in the manifest are
+    skipped. A crash between the two writes only means that batch is redone;
+    load_rows() drops the duplicate rows.
+    """
+
+    def __init__(self, out_dir, batch_size=50, columns=TRAIN_COLUMNS):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.batch_size = batch_size
+        self.columns = columns
+        self.rows_path = os.path.join(out_dir, "rows.csv")
+        self.manifest_path = os.path.join(out_dir, "manifest.txt")
+        self._rows = []
+        self._keys = []
+        self.done = set()
+
+        self._drop_torn_tail(self.rows_path)
+        self._drop_torn_tail(self.manifest_path)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        if self.done:
+            print(f'Resuming: {len(self.done)} candidates already collected in {out_dir}')
+
+    @staticmethod
+    def _drop_torn_tail(path):
+        """Cut a partially written last line left by a crash mid-write."""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def is_done(self, lat, lon):
+        return candidate_key(lat, lon) in self.done
+
+    def pending(self, candidates):
+        """Candidates not yet in the manifest, in their original order."""
+        return [(lat, lon) for lat, lon in candidates if not self.is_done(lat, lon)]
+
+    def add(self, lat, lon, row=None):
+        """Record a finished candidate, with its training row if it produced one."""
+        if row is not None:
+            self._rows.append(row)
+        self._keys.append(candidate_key(lat, lon))
+        if len(self._keys) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._keys:
+            return
+        if self._rows:
+            new_file = not os.path.exists(self.rows_path) or os.path.getsize(self.rows_path) == 0
+            with open(self.rows_path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.columns, extrasaction="ignore")
+                if new_file:
+                    writer.writeheader()
+                writer.writerows(self._rows)
+                f.flush()
+                os.fsync(f.fileno())
+        _fsync_append(self.manifest_path, "".join(k + "\n" for k in self._keys))
+        self.done.update(self._keys)
+        self._rows, self._keys = [], []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_rows(self):
+        """All collected rows, one per candidate."""
+        if not os.path.exists(self.rows_path) or os.path.getsize(self.rows_path) == 0:
+            return pd.DataFrame(columns=self.columns)
+        df = pd.read_csv(self.rows_path)
+        return df.drop_duplicates(subset=["lat", "lon"], keep="last").reset_index(drop=True)
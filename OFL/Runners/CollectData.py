@@ -1,10 +1,31 @@
 import streamlit as st
 import pandas as pd
 from OFL.Predictors.Predictors import build_features_for_location, generate_city_candidate_locations
-from OFL.Helpers import _get_duckdb_connection
+from OFL.Helpers import set_ee_project, tile_id
 from OFL.Runners.CollectRevenueData.CollectTaxValueDataNYC import query_point_tax_value
+from OFL.Runners.CollectRevenueData.PlutoLotIndex import PlutoLotIndex
+from OFL.Runners.CollectRevenueData.CountyAdapters import collect_county_labels, get_county_adapter, ASSIGNED
+from OFL.Predictors import FoursquareQuery
+from OFL.Cache import cache_stats, set_spatial_tolerance
+from OFL.Runners.Checkpoint import CollectionCheckpoint, candidate_key
+from OFL.Runners.WorkQueue import TileQueue, Heartbeat
+from OFL.Runners.Dataset import write_dataset
+import argparse
+import glob
+import os
+import socket
 import time
-import ee
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# City -> registered county adapter (see CountyAdapters.COUNTY_ADAPTERS)
+CITY_COUNTIES = {
+    "New York, NY": "nyc",
+    "Los Angeles, CA": "la",
+    "Chicago, IL": "cook",
+    "Houston, TX": "harris",
+    "Phoenix, AZ": "maricopa",
+    "Seattle, WA": "king",
+}
 
 
 def build_train_vars(candidates
@@ -12,17 +33,30 @@ def build_train_vars(candidates
                      , cr
                      , CENSUS_API_KEY
                      , _fsq_duckdb_con
-                     , _fsq_query_cache):
-
+                     , _fsq_query_cache
+                     , labels=None
+                     , city=None
+                     , checkpoint=None):
+    """
+    labels: optional DataFrame from collect_county_labels, aligned with candidates.
+    Without it each candidate is labeled with a MapPLUTO point query.
+    checkpoint: optional CollectionCheckpoint; finished candidates are skipped
+    and new rows are appended to it in batches instead of kept in memory.
+    """
     rows = []
     cnt_ = 0
 
-    for lat, lon in candidates:
+    for i, (lat, lon) in enumerate(candidates):
+        if checkpoint is not None and checkpoint.is_done(lat, lon):
+            continue
         points = lat, lon
         print(f'Points for tax value {points}')
-        Y = query_point_tax_value(lat, lon)
+        if labels is not None:
+            Y = {"status": labels["status"].iat[i], "assesstot": labels["assessed_value"].iat[i]}
+        else:
+            Y = query_point_tax_value(lat, lon)
 
-        if Y["status"] == "Tax value assigned":
+        if Y["status"] == ASSIGNED:
             print(f'revenue Y: {Y}')
             X_df = build_features_for_location(lat, lon,
                                                radius_m, cr,
@@ -33,30 +67,178 @@ def build_train_vars(candidates
             agg = X_df.mean(numeric_only=True).to_dict()
             print(f'Points for tax value {points}')
             agg["lat"], agg["lon"], agg["revenue"] = lat, lon, Y["assesstot"]
-            rows.append(agg)
+            if city is not None:
+                agg["city"] = city
+            if checkpoint is not None:
+                checkpoint.add(lat, lon, agg)
+            else:
+                rows.append(agg)
+        elif checkpoint is not None:
+            checkpoint.add(lat, lon)
         cnt_ += 1
 
+    if checkpoint is not None:
+        checkpoint.flush()
+        print(f'Collected {len(checkpoint.done)} candidates so far in {checkpoint.out_dir}')
     print(f'Count of successful rows {len(rows)}')
     return rows
 
 
 def build_df(rows, dir_path=""):
-    df = pd.DataFrame(rows)
-    df.to_csv(dir_path + 'location_revenue_and_predictors.csv', index=False)
-    print(f'Successfully downloaded dataset to specified location')
-    pass
+    """Write the collected rows as the typed, city-partitioned Parquet dataset (see Dataset.TRAIN_SCHEMA)."""
+    path = write_dataset(pd.DataFrame(rows), dir_path)
+    print(f'Successfully downloaded dataset to {path}')
+
+
+def shard_candidates(candidates_by_city, n_shards, tile_m=1000):
+    """
+    Deterministically split {city: [(lat, lon), ...]} into n_shards of the same
+    shape. Candidates are grouped by spatial tile and whole tiles are dealt out
+    in sorted order, so each shard covers compact areas (good cache locality)
+    and a rerun assigns every candidate to the same shard.
+    """
+    tiles = {}
+    for city, candidates in candidates_by_city.items():
+        for lat, lon in candidates:
+            tiles.setdefault((city, tile_id(lat, lon, tile_m)), []).append((lat, lon))
+
+    total = sum(len(v) for v in tiles.values())
+    target = total / n_shards if n_shards else total
+    shards = [{} for _ in range(n_shards)]
+    shard, filled = 0, 0
+    for (city, _), pts in sorted(tiles.items()):
+        # Move on once this shard has its share, keeping the last shard open for the remainder
+        if filled >= target and shard < n_shards - 1:
+            shard, filled = shard + 1, 0
+        shards[shard].setdefault(city, []).extend(pts)
+        filled += len(pts)
+    return shards
+
+
+def labels_for(labels, candidates):
+    """Rows of a collect_county_labels DataFrame aligned with candidates."""
+    by_key = labels.assign(_key=[candidate_key(a, b) for a, b in zip(labels["lat"], labels["lon"])])
+    by_key = by_key.drop_duplicates("_key").set_index("_key")
+    return by_key.reindex([candidate_key(a, b) for a, b in candidates]).reset_index(drop=True)
+
+
+def collect_shard(shard_id, candidates_by_city, labels_by_city, out_dir, params):
+    """
+    Run build_train_vars for one shard into its own checkpoint directory.
+    Runs in a worker process, so it sets up its own Earth Engine session and DuckDB connection.
+    Returns throughput stats for the shard.
+    """
+    start = time.time()
+    if params.get("ee_project"):
+        set_ee_project(params["ee_project"])  # Earth Engine and DuckDB are set up in this process on first use
+    set_spatial_tolerance(params["spatial_tolerance_m"])
+    con = None
+    n = sum(len(v) for v in candidates_by_city.values())
+    with CollectionCheckpoint(out_dir, batch_size=params["checkpoint_batch_size"]) as checkpoint:
+        for city_name, candidates in candidates_by_city.items():
+            build_train_vars(candidates, params["radius_m"], params["cr"], params["census_api_key"],
+                             con, FoursquareQuery._fsq_count_cache,
+                             labels=labels_by_city[city_name], city=city_name, checkpoint=checkpoint)
+    seconds = time.time() - start
+    return {"shard": shard_id, "candidates": n, "seconds": seconds,
+            "candidates_per_min": 60 * n / seconds if seconds else 0.0}
+
 
+def run_sharded(shards, labels_by_shard, shard_dirs, params, workers):
+    """Run shards in a process pool, reporting per-shard throughput as they finish."""
+    stats = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(collect_shard, i, shards[i], labels_by_shard[i], shard_dirs[i], params)
+                   for i in range(len(shards)) if any(shards[i].values())]
+        for fut in as_completed(futures):
+            st_ = fut.result()
+            stats.append(st_)
+            print(f"Shard {st_['shard']}: {st_['candidates']} candidates in {st_['seconds'] / 60:.1f} min "
+                  f"({st_['candidates_per_min']:.1f}/min)")
+    return sorted(stats, key=lambda x: x["shard"])
 
-def main():
+
+def merge_shard_outputs(shard_dirs):
+    """
+    Concatenate the rows of every shard checkpoint into one DataFrame. A tile
+    whose lease expired may have been collected by two workers, so candidates
+    are deduplicated on (lat, lon) across directories as well.
+    """
+    frames = [CollectionCheckpoint(d).load_rows() for d in shard_dirs if os.path.isdir(d)]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(subset=["lat", "lon"], keep="last").reset_index(drop=True)
+
+
+def run_queue_worker(queue, out_dir, params, worker_id=None, poll_s=30):
+    """
+    Pull tiles from a TileQueue until none are pending or leased, labeling
+    and featurizing each one into this worker's own checkpoint directory
+    (<out_dir>/<worker_id>). Several workers, on one host or many sharing
+    the queue file, can run at once; merge their outputs with merge_shard_outputs.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    if params.get("ee_project"):
+        set_ee_project(params["ee_project"])  # Earth Engine and DuckDB are set up in this process on first use
+    set_spatial_tolerance(params["spatial_tolerance_m"])
+    con = None
+    adapters = {}  # one per county for the worker's lifetime (the NYC lot index is loaded once)
+    n_tiles = 0
+    with CollectionCheckpoint(os.path.join(out_dir, worker_id), batch_size=params["checkpoint_batch_size"]) as checkpoint:
+        while True:
+            task = queue.lease(worker_id)
+            if task is None:
+                if queue.counts().get("leased"):
+                    # Another worker may still die and leave its tile to be re-queued
+                    time.sleep(poll_s)
+                    continue
+                break
+            tile, city_name, candidates = task
+            heartbeat = Heartbeat(queue, tile, worker_id, queue.lease_s / 3)
+            try:
+                county = CITY_COUNTIES[city_name]
+                if county not in adapters:
+                    adapters[county] = get_county_adapter(county, **params.get("adapter_kwargs", {}).get(county, {}))
+                pending = checkpoint.pending(candidates)
+                labels = adapters[county].label_points(pending, max_workers=params.get("label_budgets", {}).get(county))
+                build_train_vars(pending, params["radius_m"], params["cr"], params["census_api_key"],
+                                 con, FoursquareQuery._fsq_count_cache,
+                                 labels=labels, city=city_name, checkpoint=checkpoint)
+                if heartbeat.lost or not queue.complete(tile, worker_id):
+                    print(f'Lease on tile {tile} expired before completion; it may be redone by another worker')
+                n_tiles += 1
+            except Exception as e:
+                print(f'Tile {tile} failed: {e}')
+                queue.release(tile, worker_id, error=str(e))
+            finally:
+                heartbeat.stop()
+    print(f'Worker {worker_id} finished {n_tiles} tiles; queue {queue.counts()}')
+    return n_tiles
+
+
+def main(argv=None):
     """
     Collects data from various Geolocation and demographics
      to build data set that is saved to csv for later model training
     """
+    parser = argparse.ArgumentParser(description="Collect location features and revenue labels")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="split candidates into this many spatial shards run in a process pool (0 = one process)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for --shards")
+    parser.add_argument("--tile-m", type=float, default=1000, help="tile size (m) used to partition shards")
+    parser.add_argument("--queue", help="SQLite task queue file shared by distributed workers")
+    parser.add_argument("--enqueue", action="store_true", help="fill --queue with candidate tiles and exit")
+    parser.add_argument("--worker", action="store_true", help="lease and collect tiles from --queue until it is drained")
+    parser.add_argument("--merge", action="store_true", help="merge the worker outputs of --queue into the dataset csv")
+    parser.add_argument("--lease-s", type=float, default=600, help="seconds a leased tile stays reserved without a heartbeat")
+    parser.add_argument("--no-wal", action="store_true", help="use rollback journaling (queue file on a network filesystem)")
+    args = parser.parse_args(argv)
+
     global _fsq_duckdb_con
     _fsq_duckdb_con = None
-    _fsq_query_cache = {}
-    ee.Authenticate()
-    ee.Initialize(project='ee-shaddie77')
+    _fsq_query_cache = FoursquareQuery._fsq_count_cache  # bounded, shared with other callers
+    set_ee_project('ee-shaddie77')  # initialized (and authenticated if needed) on first population lookup
 
     CENSUS_API_KEY = st.secrets.get("CENSUS_API_KEY", "")  # use streamlit secrets to store and retrieve api
     # lat, lon = 40.7128, -74.0060  # Example: Manhattan
@@ -67,18 +249,88 @@ def main():
     radius_m = 100  # Neighborhood radius
     cr = 10  # Subcircle radius
     radius_c = 50  # Candidate facility radius (for city split)
-    city_name = "New York, NY"
+    spatial_tolerance_m = 2  # Reuse cached pop/POI/FSQ results of sub-points this close (0 = exact only)
+    city_names = ["New York, NY"]  # any keys of CITY_COUNTIES; labels are collected for all of them in parallel
+    label_budgets = {"nyc": 8, "la": 4, "cook": 4, "harris": 4, "maricopa": 4, "king": 4}  # concurrent requests per county
+    pluto_lots_path = "/Users/rckyi/Documents/Data/mappluto_lots.parquet"  # local MapPLUTO export (built once)
+    checkpoint_dir = "/Users/rckyi/Documents/Data/collect_checkpoint/"  # rerun to resume an interrupted collection
+    checkpoint_batch_size = 50  # candidates per durable append
 
     # --- Parameters
     location_name = "Times Square, New York, NY"
     # location_name = "New York, NY"
 
-    candidates = generate_city_candidate_locations(city_name, radius_c)
-    print(f'size of candidates {len(candidates)}')
-    print(f'element of candidates {candidates[0]}')
-    _fsq_duckdb_con = _get_duckdb_connection(_fsq_duckdb_con)
-    rows = build_train_vars(candidates, radius_m, cr, CENSUS_API_KEY, _fsq_duckdb_con, _fsq_query_cache)
-    build_df(rows, "/Users/rckyi/Documents/Data/")
+    params = {"radius_m": radius_m, "cr": cr, "census_api_key": CENSUS_API_KEY,
+              "spatial_tolerance_m": spatial_tolerance_m, "checkpoint_batch_size": checkpoint_batch_size,
+              "ee_project": 'ee-shaddie77', "label_budgets": label_budgets,
+              "adapter_kwargs": {"nyc": {"lots_path": pluto_lots_path}}}
+
+    queue = TileQueue(args.queue, lease_s=args.lease_s, wal=not args.no_wal) if args.queue else None
+    worker_dir = os.path.join(checkpoint_dir, "workers")
+    if queue is not None and args.worker:
+        run_queue_worker(queue, worker_dir, params)
+        return
+    if queue is not None and args.merge:
+        rows = merge_shard_outputs(sorted(glob.glob(os.path.join(worker_dir, "*"))))
+        if rows.empty:
+            print(f'No worker output under {worker_dir} yet; dataset left unchanged')
+        else:
+            build_df(rows, "/Users/rckyi/Documents/Data/")
+        print(f'Queue {queue.counts()}')
+        return
+
+    set_spatial_tolerance(spatial_tolerance_m)
+    candidates_by_city = {}
+    for city_name in city_names:
+        candidates = generate_city_candidate_locations(city_name, radius_c)
+        print(f'size of candidates for {city_name}: {len(candidates)}')
+        candidates_by_city[city_name] = candidates
+
+    if queue is not None and args.enqueue:
+        if "New York, NY" in city_names:
+            PlutoLotIndex.ensure_export(pluto_lots_path)  # workers on this host reuse it
+        added = queue.enqueue(candidates_by_city, args.tile_m)
+        print(f'Enqueued {added} new tiles; queue {queue.counts()}')
+        return
+
+    # One checkpoint directory per shard; a single-process run is one shard in checkpoint_dir itself
+    if args.shards:
+        shards = shard_candidates(candidates_by_city, args.shards, args.tile_m)
+        shard_dirs = [os.path.join(checkpoint_dir, f"shard_{i:03d}") for i in range(args.shards)]
+    else:
+        shards, shard_dirs = [candidates_by_city], [checkpoint_dir]
+    shards = [{c: CollectionCheckpoint(d).pending(pts) for c, pts in shard.items()}
+              for shard, d in zip(shards, shard_dirs)]
+
+    if "New York, NY" in city_names:
+        PlutoLotIndex.ensure_export(pluto_lots_path)  # one-time bulk export for the NYC adapter
+    pending_by_county = {}
+    for shard in shards:
+        for city_name, pts in shard.items():
+            pending_by_county.setdefault(CITY_COUNTIES[city_name], []).extend(pts)
+    labels = collect_county_labels(pending_by_county,
+                                   budgets=label_budgets,
+                                   adapter_kwargs={"nyc": {"lots_path": pluto_lots_path}})
+    labels_by_shard = [{c: labels_for(labels, pts) for c, pts in shard.items()} for shard in shards]
+
+    if args.shards:
+        run_sharded(shards, labels_by_shard, shard_dirs, params, args.workers)
+        rows = merge_shard_outputs(shard_dirs)
+        if rows.empty:
+            print(f'No rows collected by any of the {len(shard_dirs)} shards; dataset left unchanged')
+        else:
+            build_df(rows, "/Users/rckyi/Documents/Data/")
+    else:
+        with CollectionCheckpoint(checkpoint_dir, batch_size=checkpoint_batch_size) as checkpoint:
+            for city_name, candidates in shards[0].items():
+                build_train_vars(candidates, radius_m, cr, CENSUS_API_KEY, _fsq_duckdb_con, _fsq_query_cache,
+                                 labels=labels_by_shard[0][city_name], city=city_name, checkpoint=checkpoint)
+        rows = checkpoint.load_rows()
+        if rows.empty:
+            print(f'No rows collected under {checkpoint_dir}; dataset left unchanged')
+        else:
+            build_df(rows, "/Users/rckyi/Documents/Data/")
+    print(f'Cache stats {cache_stats()}')
 
 
 if __name__ == "__main__":
@@ -1,17 +1,23 @@
 import csv
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from OFL import Http
+
+PLUTO_URL = (
+    "https://services5.arcgis.com/GfwWNkhOj9bNBqoJ/ArcGIS/rest/services/"
+    "MAPPLUTO/FeatureServer/0/query"
+)
+REQ_TIMEOUT = 30
+
+_CSV_FIELDS = ["latitude", "longitude", "bbl", "assesstot", "status"]
 
 
 def query_point_tax_value(lat, lon, extra_fields=None):
     """
     Query MapPLUTO for a given lat/lon.
     Returns dict with bbl and assesstot, or indicates not assigned.
+    For many points use PlutoLotIndex.label_points instead.
     """
-    PLUTO_URL = (
-        "https://services5.arcgis.com/GfwWNkhOj9bNBqoJ/ArcGIS/rest/services/"
-        "MAPPLUTO/FeatureServer/0/query"
-    )
     fields = ["bbl", "assesstot"] + (extra_fields or [])
     params = {
         "geometry": f"{lon},{lat}",
@@ -21,7 +27,7 @@ def query_point_tax_value(lat, lon, extra_fields=None):
         "outFields": ",".join(fields),
         "f": "json"
     }
-    resp = requests.get(PLUTO_URL, params=params)
+    resp = Http.get(PLUTO_URL, params=params, timeout=REQ_TIMEOUT)
     resp.raise_for_status()
     res = resp.json()
     feats = res.get("features", [])
@@ -35,33 +41,113 @@ def query_point_tax_value(lat, lon, extra_fields=None):
     }
 
 
-def batch_process_tax_value(points, output_csv=None, output_geojson=None):
-    results = []
-    for lat, lon in points:
-        info = query_point_tax_value(lat, lon)
+def iter_tax_values(points, max_workers=8, max_in_flight=None):
+    """
+    Query tax values for (lat, lon) points concurrently over the shared pooled client,
+    yielding each record (with latitude/longitude) as soon as it finishes.
+    At most max_in_flight points are pending at once, so memory stays flat
+    however long the input iterable is. Failed points are yielded with the
+    error in status rather than aborting the batch.
+    """
+    max_in_flight = max_in_flight or max_workers * 4
+
+    def work(lat, lon):
+        try:
+            info = query_point_tax_value(lat, lon)
+        except Exception as e:
+            info = {"bbl": None, "assesstot": None, "status": f"Query failed: {e}"}
         info.update({"latitude": lat, "longitude": lon})
-        results.append(info)
+        return info
+
+    points = iter(points)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for lat, lon in points:
+                pending.add(executor.submit(work, lat, lon))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+
+class GeoJSONStreamWriter:
+    """
+    Writes a GeoJSON FeatureCollection one feature at a time.
+    The collection is closed on close()/exit, including after an error,
+    so a partially finished batch is still a valid file.
+    """
 
-    if output_csv:
-        with open(output_csv, "w", newline="") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=["latitude", "longitude", "bbl", "assesstot", "status"])
+    def __init__(self, path):
+        self._f = open(path, "w")
+        self._f.write('{"type": "FeatureCollection", "features": [\n')
+        self._first = True
+
+    def write(self, lon, lat, properties):
+        feat = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": properties,
+        }
+        if not self._first:
+            self._f.write(",\n")
+        self._f.write(json.dumps(feat, default=str))
+        self._first = False
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.write("\n]}\n")
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def batch_process_tax_value(points, output_csv=None, output_geojson=None, max_workers=8, flush_every=100):
+    """
+    Query tax values for many points concurrently, streaming each finished
+    record to CSV and/or GeoJSON. Nothing is held in memory beyond the
+    in-flight requests; files are flushed every flush_every records.
+    Returns the number of records written.
+    """
+    csvfile = open(output_csv, "w", newline="") if output_csv else None
+    geo = GeoJSONStreamWriter(output_geojson) if output_geojson else None
+    n = 0
+    try:
+        writer = None
+        if csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=_CSV_FIELDS, extrasaction="ignore")
             writer.writeheader()
-            writer.writerows(results)
-
-    if output_geojson:
-        geo = {"type": "FeatureCollection", "features": []}
-        for rec in results:
-            feat = {
-                "type": "Feature",
-                "geometry": {"type": "Point", "coordinates": [rec["longitude"], rec["latitude"]]},
-                "properties": {
+
+        for rec in iter_tax_values(points, max_workers=max_workers):
+            if writer:
+                writer.writerow(rec)
+            if geo:
+                geo.write(rec["longitude"], rec["latitude"], {
                     "bbl": rec["bbl"],
                     "assesstot": rec["assesstot"],
                     "status": rec["status"]
-                }
-            }
-            geo["features"].append(feat)
-        with open(output_geojson, "w") as f:
-            json.dump(geo, f, indent=2)
+                })
+            n += 1
+            if n % flush_every == 0:
+                if csvfile:
+                    csvfile.flush()
+                if geo:
+                    geo.flush()
+    finally:
+        if csvfile:
+            csvfile.close()
+        if geo:
+            geo.close()
 
-    return results
\ No newline at end of file
+    print(f'Wrote {n} tax value records')
+    return n
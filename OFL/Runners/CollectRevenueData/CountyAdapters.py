@@ -0,0 +1,230 @@
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from OFL.Runners.CollectRevenueData import RevenueDataByGov as gov
+from OFL.Runners.CollectRevenueData.CollectTaxValueDataNYC import query_point_tax_value
+from OFL.Runners.CollectRevenueData.PlutoLotIndex import PlutoLotIndex
+
+# Normalized label schema shared by every county
+LABEL_COLUMNS = ["county", "lat", "lon", "parcel_id", "assessed_value", "source", "status"]
+ASSIGNED = "Tax value assigned"
+NOT_ASSIGNED = "No tax value assigned"
+
+# name -> adapter class, filled by @register_county
+COUNTY_ADAPTERS = {}
+
+
+def register_county(cls):
+    COUNTY_ADAPTERS[cls.name] = cls
+    return cls
+
+
+def get_county_adapter(name, **kwargs):
+    try:
+        return COUNTY_ADAPTERS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown county '{name}'. Registered: {sorted(COUNTY_ADAPTERS)}") from None
+
+
+def _first_present(attrs, fields):
+    """
+    First non-null value among candidate field names (case-insensitive).
+    A tuple of names means the sum of those fields (e.g. land + improvements).
+    """
+    lower = {k.lower(): v for k, v in attrs.items()}
+    for f in fields:
+        if isinstance(f, tuple):
+            parts = [lower.get(p.lower()) for p in f]
+            if all(p is not None for p in parts):
+                return sum(float(p) for p in parts)
+        elif lower.get(f.lower()) is not None:
+            return lower[f.lower()]
+    return None
+
+
+class CountyAdapter:
+    """
+    Common (lat, lon) -> assessed value interface. Subclasses implement
+    label_point, or override label_points when the source supports batching.
+    """
+    name = None
+    source = None
+    max_workers = 4
+
+    def label_point(self, lat, lon):
+        """Return (parcel_id, assessed_value) for one point; None values when not found."""
+        raise NotImplementedError
+
+    def _row(self, lat, lon, parcel_id, value, status=None):
+        if value is not None:
+            value = float(value)
+        return {
+            "county": self.name,
+            "lat": lat,
+            "lon": lon,
+            "parcel_id": None if parcel_id is None else str(parcel_id),
+            "assessed_value": value,
+            "source": self.source,
+            "status": status or (ASSIGNED if value is not None else NOT_ASSIGNED),
+        }
+
+    def label_points(self, points, max_workers=None):
+        """Label points concurrently; returns a DataFrame in LABEL_COLUMNS order, aligned with points."""
+
+        def work(point):
+            lat, lon = point
+            try:
+                parcel_id, value = self.label_point(lat, lon)
+                return self._row(lat, lon, parcel_id, value)
+            except Exception as e:
+                return self._row(lat, lon, None, None, status=f"Query failed: {e}")
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            rows = list(executor.map(work, points))
+        return pd.DataFrame(rows, columns=LABEL_COLUMNS)
+
+
+@register_county
+class NYCAdapter(CountyAdapter):
+    """MapPLUTO assesstot; vectorized through the local lot index when available."""
+    name = "nyc"
+    source = "MapPLUTO"
+
+    def __init__(self, lots_path=None):
+        self.lot_index = PlutoLotIndex.load(lots_path) if lots_path and os.path.exists(lots_path) else None
+
+    def label_point(self, lat, lon):
+        res = query_point_tax_value(lat, lon)
+        return res["bbl"], res["assesstot"]
+
+    def label_points(self, points, max_workers=None):
+        if self.lot_index is None:
+            return super().label_points(points, max_workers)
+        labels = self.lot_index.label_points(points)
+        rows = [self._row(lat, lon, y["bbl"], y["assesstot"]) for (lat, lon), y in zip(points, labels)]
+        return pd.DataFrame(rows, columns=LABEL_COLUMNS)
+
+
+class ArcGISPointAdapter(CountyAdapter):
+    """Point-in-parcel query against an ArcGIS parcels layer. Field names vary; candidates are tried in order."""
+    base = None
+    layer = 0
+    id_fields = ()
+    value_fields = ()
+
+    def label_point(self, lat, lon):
+        res = gov._arcgis_point_query(self.base, lat, lon, self.layer)
+        feats = res.get("features", [])
+        if not feats:
+            return None, None
+        attrs = feats[0].get("attributes", {})
+        return _first_present(attrs, self.id_fields), _first_present(attrs, self.value_fields)
+
+
+@register_county
+class LACountyAdapter(ArcGISPointAdapter):
+    name = "la"
+    source = "LA County Assessor PAIS"
+    base = gov.LA_PARCELS_FULL_BASE
+    id_fields = ("AIN", "APN")
+    value_fields = ("Roll_TotalValue", "TotalValue", ("Roll_LandValue", "Roll_ImpValue"))
+
+
+@register_county
+class HarrisCountyAdapter(ArcGISPointAdapter):
+    name = "harris"
+    source = "HCAD"
+    base = gov.HCAD_PARCELS_BASE
+    id_fields = ("HCAD_NUM", "acct_num")
+    value_fields = ("total_appraised_val", "appr_val", "total_market_val")
+
+
+@register_county
+class MaricopaCountyAdapter(ArcGISPointAdapter):
+    name = "maricopa"
+    source = "Maricopa County Assessor"
+    base = gov.MARICOPA_PARCELS_BASE
+    id_fields = ("APN",)
+    value_fields = ("FCV_CUR", "FULL_CASH_VALUE", "LPV_CUR")
+
+
+@register_county
+class KingCountyAdapter(ArcGISPointAdapter):
+    name = "king"
+    source = "King County Parcels"
+    base = gov.KING_CO_PARCELS_FEATURESERVICE
+    id_fields = ("PIN", "PARCELID", "PARCEL_ID")
+    value_fields = ("APPR_TOTAL", ("APPRLNDVAL", "APPR_IMPR"))
+
+
+@register_county
+class CookCountyAdapter(CountyAdapter):
+    """
+    Nearest parcel-universe PIN per point (no point-in-parcel API), then one
+    batched assessed-values lookup for all matched PINs.
+    """
+    name = "cook"
+    source = "Cook County Assessor"
+    value_fields = ("board_tot", "certified_tot", "mailed_tot")
+
+    def __init__(self, app_token=None, search_radius_m=30):
+        self.app_token = app_token
+        self.search_radius_m = search_radius_m
+
+    def _nearest_pin(self, point):
+        lat, lon = point
+        rows = gov.cook_parcels_near_point(lat, lon, self.search_radius_m, self.app_token)
+        best, best_d = None, None
+        for r in rows:
+            try:
+                d = math.hypot(float(r["lat"]) - lat, (float(r["lon"]) - lon) * math.cos(math.radians(lat)))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if best_d is None or d < best_d:
+                best, best_d = r.get("pin"), d
+        return best
+
+    def label_points(self, points, max_workers=None):
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            pins = list(executor.map(self._nearest_pin, points))
+
+        values = {}
+        found = [p for p in pins if p]
+        if found:
+            df = gov.cook_assessed_values_bulk(found, self.app_token, max_workers or self.max_workers)
+            if not df.empty:
+                if "year" in df:
+                    df = df.sort_values("year")
+                for rec in df.to_dict("records"):
+                    v = _first_present(rec, self.value_fields)
+                    if v is not None:
+                        values[rec["pin"]] = v  # latest year wins
+
+        rows = [self._row(lat, lon, pin, values.get(pin)) for (lat, lon), pin in zip(points, pins)]
+        return pd.DataFrame(rows, columns=LABEL_COLUMNS)
+
+
+def collect_county_labels(points_by_county, budgets=None, adapter_kwargs=None):
+    """
+    Label points for several counties in parallel, each county with its own
+    concurrency budget (budgets: county -> max workers; defaults to the adapter's).
+    Returns one DataFrame in the normalized LABEL_COLUMNS schema.
+    """
+    budgets = budgets or {}
+    adapter_kwargs = adapter_kwargs or {}
+
+    def run(county):
+        start = time.time()
+        adapter = get_county_adapter(county, **adapter_kwargs.get(county, {}))
+        df = adapter.label_points(points_by_county[county], max_workers=budgets.get(county))
+        n_ok = int((df["status"] == ASSIGNED).sum())
+        print(f'{county}: labeled {n_ok}/{len(df)} points in {time.time() - start:.1f}s')
+        return df
+
+    if not points_by_county:
+        return pd.DataFrame(columns=LABEL_COLUMNS)
+    with ThreadPoolExecutor(max_workers=len(points_by_county)) as executor:
+        frames = list(executor.map(run, points_by_county))
+    return pd.concat(frames, ignore_index=True)
@@ -3,20 +3,35 @@ import certifi
 import hashlib
 import json
 import os
+import threading
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from OFL.Cache import BoundedCache
+from OFL import Http
 
 # Config
 _GEOCODE_CACHE_FILE = "/Users/rckyi/Documents/Data/geocode_cache.json"
 _GEOCODE_CACHE_EXPIRY_DAYS = 30   # configurable expiry in days
 
-# In-memory cache (normalized)
-_geocode_cache = {}
+# In-memory cache (normalized): key -> (lat, lon), bounded LRU with the expiry above as TTL
+_geocode_cache = BoundedCache("geocoding.nominatim", max_entries=50_000,
+                              ttl=_GEOCODE_CACHE_EXPIRY_DAYS * 24 * 3600)
+
+# Requests currently on the wire, keyed like the cache, so concurrent callers
+# asking for the same name share one request instead of each making their own
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _iso_to_epoch(ts):
+    # timestamps on disk are naive UTC (datetime.utcnow().isoformat())
+    return datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp()
+
 
 def _load_cache():
     """Load and normalize on-disk cache into _geocode_cache."""
-    global _geocode_cache
-    _geocode_cache = {}
+    _geocode_cache.clear()
     if not os.path.exists(_GEOCODE_CACHE_FILE):
         return
 
@@ -26,7 +41,7 @@ def _load_cache():
     except Exception:
         return
 
-    now_iso = datetime.utcnow().isoformat()
+    now = time.time()
     for k, v in raw.items():
         # v can be several forms (legacy list [lat,lon] or new dict)
         if isinstance(v, dict):
@@ -35,19 +50,21 @@ def _load_cache():
             ts = v.get("timestamp")
             if isinstance(latlon, (list, tuple)) and ts:
                 try:
-                    # validate timestamp parseable
-                    datetime.fromisoformat(ts)
-                    _geocode_cache[k] = {"latlon": (float(latlon[0]), float(latlon[1])), "timestamp": ts}
+                    stored_at = _iso_to_epoch(ts)
                 except Exception:
                     # if timestamp invalid, treat as fresh with now
-                    _geocode_cache[k] = {"latlon": (float(latlon[0]), float(latlon[1])), "timestamp": now_iso}
+                    stored_at = now
+                try:
+                    _geocode_cache.set(k, (float(latlon[0]), float(latlon[1])), stored_at=stored_at)
+                except Exception:
+                    continue
             else:
                 # skip malformed dict entries
                 continue
         elif isinstance(v, list) and len(v) == 2:
             # legacy: [lat, lon] -> convert to dict format with current timestamp
             try:
-                _geocode_cache[k] = {"latlon": (float(v[0]), float(v[1])), "timestamp": now_iso}
+                _geocode_cache.set(k, (float(v[0]), float(v[1])), stored_at=now)
             except Exception:
                 continue
         else:
@@ -57,9 +74,10 @@ def _load_cache():
 def _save_cache():
     """Persist normalized cache to disk (convert latlon tuples to lists for JSON)."""
     serializable = {}
-    for k, v in _geocode_cache.items():
-        serializable[k] = {"latlon": [v["latlon"][0], v["latlon"][1]], "timestamp": v["timestamp"]}
-    tmp = _GEOCODE_CACHE_FILE + ".tmp"
+    for k, latlon, stored_at in _geocode_cache.items():
+        ts = datetime.fromtimestamp(stored_at, timezone.utc).replace(tzinfo=None).isoformat()
+        serializable[k] = {"latlon": [latlon[0], latlon[1]], "timestamp": ts}
+    tmp = _GEOCODE_CACHE_FILE + f".{threading.get_ident()}.tmp"
     with open(tmp, "w") as f:
         json.dump(serializable, f)
     os.replace(tmp, _GEOCODE_CACHE_FILE)
@@ -67,66 +85,154 @@ def _save_cache():
 # load/normalize cache at import/run time
 _load_cache()
 
-def geocode_direct(geolocation_name, use_cache=True, rate_limit=1.0):
+class _RateLimiter:
     """
-    Geocode a place name into (lat, lon) using Nominatim directly (requests + certifi).
-    Caches results on disk with expiry to avoid repeated hits.
-    Respects a simple rate limit (default: 1s) before making external requests.
+    Process-wide minimum spacing between outgoing requests.
+    Unlike a fixed sleep before every call, a caller only waits for whatever
+    is left of the interval since the previous request.
     """
-    key = hashlib.sha1(geolocation_name.strip().lower().encode()).hexdigest()
-    now = datetime.utcnow()
 
-    # Cache check with expiry (normalized entries)
-    if use_cache and key in _geocode_cache:
-        entry = _geocode_cache[key]
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = 0.0
 
-        # entry should be dict {"latlon": (lat, lon), "timestamp": iso}
-        if isinstance(entry, dict) and "latlon" in entry and "timestamp" in entry:
-            try:
-                ts = datetime.fromisoformat(entry["timestamp"])
-                if now - ts < timedelta(days=_GEOCODE_CACHE_EXPIRY_DAYS):
-                    return tuple(entry["latlon"])
-                else:
-                    # expired -> drop and continue to requery
-                    del _geocode_cache[key]
-            except Exception:
-                # malformed timestamp -> drop and requery
-                del _geocode_cache[key]
-        else:
-            # fallback: if unexpectedly not dict, remove and requery
-            try:
-                del _geocode_cache[key]
-            except Exception:
-                pass
+    def wait(self, interval):
+        if not interval or interval <= 0:
+            return
+        with self._lock:
+            delay = self._last + interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last = time.monotonic()
 
+
+# Shared by every Nominatim caller in this process
+_nominatim_limiter = _RateLimiter()
+
+
+def _cache_key(geolocation_name):
+    return hashlib.sha1(geolocation_name.strip().lower().encode()).hexdigest()
+
+
+def _request_latlon(geolocation_name, rate_limit):
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": geolocation_name, "format": "json", "limit": 1}
     headers = {"User-Agent": "revenue_estimator_app"}
 
-    try:
-        # polite rate limiting before making request
-        if rate_limit and rate_limit > 0:
-            time.sleep(rate_limit)
+    # polite rate limiting before making request
+    _nominatim_limiter.wait(rate_limit)
 
-        resp = requests.get(url, params=params, headers=headers, verify=certifi.where(), timeout=10)
-        resp.raise_for_status()
-        results = resp.json()
-        if not results:
-            raise ValueError(f"Could not geocode location: {geolocation_name}")
+    resp = Http.get(url, params=params, headers=headers, verify=certifi.where(), timeout=10)
+    resp.raise_for_status()
+    results = resp.json()
+    if not results:
+        raise ValueError(f"Could not geocode location: {geolocation_name}")
 
-        latlon = (float(results[0]["lat"]), float(results[0]["lon"]))
+    return float(results[0]["lat"]), float(results[0]["lon"])
+
+
+def _geocode_miss(geolocation_name, key, use_cache, rate_limit, persist=True):
+    """
+    Resolve a cache miss. If another thread is already fetching the same key,
+    wait for its result instead of sending a duplicate request.
+    """
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = Future()
+            _inflight[key] = fut
+
+    if not owner:
+        return fut.result()
+
+    try:
+        latlon = _request_latlon(geolocation_name, rate_limit)
 
         # Cache with timestamp
         if use_cache:
-            _geocode_cache[key] = {"latlon": latlon, "timestamp": now.isoformat()}
-            try:
-                _save_cache()
-            except Exception:
-                # non-fatal: caching failure shouldn't crash geocoding
-                pass
+            _geocode_cache.set(key, latlon)
+            if persist:
+                try:
+                    _save_cache()
+                except Exception:
+                    # non-fatal: caching failure shouldn't crash geocoding
+                    pass
 
+        fut.set_result(latlon)
         return latlon
 
     except Exception as e:
         # provide a clear error message
-        raise RuntimeError(f"Geocoding failed for '{geolocation_name}': {e}")
+        err = RuntimeError(f"Geocoding failed for '{geolocation_name}': {e}")
+        fut.set_exception(err)
+        raise err
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def geocode_direct(geolocation_name, use_cache=True, rate_limit=1.0):
+    """
+    Geocode a place name into (lat, lon) using Nominatim directly (requests + certifi).
+    Caches results on disk with expiry to avoid repeated hits.
+    Respects a simple rate limit (default: 1s) between external requests,
+    shared across all callers in the process.
+    """
+    key = _cache_key(geolocation_name)
+
+    # Cache check with expiry (normalized entries)
+    if use_cache:
+        latlon = _geocode_cache.get(key)
+        if latlon is not None:
+            return latlon
+
+    return _geocode_miss(geolocation_name, key, use_cache, rate_limit)
+
+
+def geocode_many(geolocation_names, use_cache=True, rate_limit=1.0):
+    """
+    Geocode many place names, yielding (name, (lat, lon), error) as each one completes.
+
+    Names that normalize to the same cache key are requested once. Cache hits
+    are yielded immediately; misses go through a single rate-limited queue so
+    the whole batch takes the minimum time Nominatim allows. On failure the
+    latlon is None and error holds the exception.
+    """
+    by_key = {}
+    for name in geolocation_names:
+        by_key.setdefault(_cache_key(name), []).append(name)
+
+    misses = []
+    for key, names in by_key.items():
+        latlon = _geocode_cache.get(key) if use_cache else None
+        if latlon is None:
+            misses.append((key, names))
+            continue
+        for name in dict.fromkeys(names):
+            yield name, latlon, None
+
+    if not misses:
+        return
+
+    # One worker: requests go out back to back, spaced only by the rate limit
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        futures = {
+            executor.submit(_geocode_miss, names[0], key, use_cache, rate_limit, False): names
+            for key, names in misses
+        }
+        for fut in as_completed(futures):
+            try:
+                latlon, err = fut.result(), None
+            except Exception as e:
+                latlon, err = None, e
+            for name in dict.fromkeys(futures[fut]):
+                yield name, latlon, err
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if use_cache:
+            try:
+                _save_cache()
+            except Exception:
+                pass
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+import pandas as pd
+from OFL.Lazy import LazyModule
+from OFL.Runners.CollectRevenueData.CollectTaxValueDataNYC import PLUTO_URL
+from OFL.Runners.CollectRevenueData.RevenueDataByGov import iter_arcgis_pages
+
+gpd = LazyModule("geopandas")
+
+_PLUTO_FIELDS = ["bbl", "assesstot"]
+# FeatureServer root of PLUTO_URL (which points at layer 0's /query)
+_PLUTO_BASE = PLUTO_URL.rsplit("/0/query", 1)[0]
+
+
+def export_pluto_lots(out_path, page_size=2000, max_workers=4):
+    """
+    One-time bulk export of MapPLUTO lot polygons (bbl, assesstot, EPSG:4326)
+    from the ArcGIS FeatureServer to a GeoParquet file. Pages are fetched in parallel.
+    """
+    print(f'Exporting MapPLUTO lots to {out_path} ...')
+    frames = []
+    n = 0
+    for page in iter_arcgis_pages(_PLUTO_BASE, 0, out_fields=",".join(_PLUTO_FIELDS), page_size=page_size,
+                                  max_workers=max_workers, outSR="4326", f="geojson"):
+        feats = page.get("features", [])
+        if not feats:
+            continue
+        frames.append(gpd.GeoDataFrame.from_features(feats, crs="EPSG:4326"))
+        n += len(feats)
+        print(f'Exported {n} lots')
+
+    lots = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+    lots.columns = [c.lower() if c != "geometry" else c for c in lots.columns]
+    lots = lots[_PLUTO_FIELDS + ["geometry"]]
+
+    tmp = out_path + ".tmp"
+    lots.to_parquet(tmp)
+    os.replace(tmp, out_path)
+    print(f'Saved {len(lots)} MapPLUTO lots to {out_path}')
+    return out_path
+
+
+def ensure_export(path):
+    """Run the bulk export to path unless the file is already there. Returns path."""
+    if not os.path.exists(path):
+        export_pluto_lots(path)
+    return path
+
+
+class PlutoLotIndex:
+    """
+    Local MapPLUTO lot polygons with an STRtree spatial index, for labeling
+    many points with bbl/assesstot at once instead of one FeatureServer request each.
+    """
+
+    def __init__(self, lots):
+        self.lots = lots.reset_index(drop=True)
+        self._bbl = self.lots["bbl"].to_numpy()
+        self._assesstot = self.lots["assesstot"].to_numpy()
+        self._tree = self.lots.sindex
+
+    @classmethod
+    def load(cls, path):
+        return cls(gpd.read_parquet(path))
+
+    @classmethod
+    def load_or_export(cls, path):
+        """Load the lot index from path, running the bulk export first if it doesn't exist yet."""
+        return cls.load(ensure_export(path))
+
+    def lookup(self, lats, lons):
+        """
+        Vectorized point-in-polygon lookup.
+        Returns (bbl, assesstot) arrays; None where the point is in no lot.
+        """
+        points = gpd.points_from_xy(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float), crs="EPSG:4326")
+        point_idx, lot_idx = self._tree.query(points, predicate="intersects")
+
+        # Keep the first intersecting lot per point (lots don't overlap; edges can touch two)
+        first_point, first = np.unique(point_idx, return_index=True)
+        bbl = np.full(len(points), None, dtype=object)
+        assesstot = np.full(len(points), None, dtype=object)
+        bbl[first_point] = self._bbl[lot_idx[first]]
+        assesstot[first_point] = self._assesstot[lot_idx[first]]
+        assesstot[pd.isna(assesstot)] = None
+        return bbl, assesstot
+
+    def label_points(self, points):
+        """
+        Label (lat, lon) points in one pass.
+        Returns one dict per point shaped like query_point_tax_value's result.
+        """
+        if not len(points):
+            return []
+        lats, lons = zip(*points)
+        bbl, assesstot = self.lookup(lats, lons)
+        return [
+            {
+                "bbl": b,
+                "assesstot": a,
+                "status": ("Tax value assigned" if a is not None else "No tax value assigned"),
+            }
+            for b, a in zip(bbl, assesstot)
+        ]
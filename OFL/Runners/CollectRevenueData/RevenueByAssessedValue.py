@@ -1,31 +1,28 @@
 import requests
 import time
+from OFL.Cache import BoundedCache, make_key, memoize
+from OFL import Http
 
-# --- Global caches (dict-based for flexibility) ---
-_census_cache = {}
-_revenue_cache = {}
+# --- Global caches ---
+_census_cache = BoundedCache("revenue.census_block", max_entries=100_000)
+_revenue_cache = BoundedCache("revenue.dof_assessment", max_entries=20_000, max_bytes=256 * 1024 * 1024)
 
 
+@memoize(_census_cache, key=lambda lat, lon, *args, **kwargs: make_key(lat, lon))
 def get_census_block(lat, lon, retries=3):
     """
     Get census block info with FCC -> Census Geocoder fallback.
     Cached by (lat, lon).
     """
-    key = (round(lat, 6), round(lon, 6))  # reduce floating point noise
-    if key in _census_cache:
-        return _census_cache[key]
-
     fcc_url = "https://geo.fcc.gov/api/census/block/find"
     params = {"latitude": lat, "longitude": lon, "format": "json"}
 
     # Try FCC first
     for attempt in range(retries):
         try:
-            resp = requests.get(fcc_url, params=params, timeout=5)
+            resp = Http.get(fcc_url, params=params, timeout=5)
             resp.raise_for_status()
-            data = resp.json()
-            _census_cache[key] = data
-            return data
+            return resp.json()
         except requests.exceptions.RequestException:
             if attempt == retries - 1:
                 break
@@ -42,7 +39,7 @@ def get_census_block(lat, lon, retries=3):
         "vintage": "Census2020_Census2020",
         "format": "json"
     }
-    resp = requests.get(geocoder_url, params=params, timeout=5)
+    resp = Http.get(geocoder_url, params=params, timeout=5)
     resp.raise_for_status()
     data = resp.json()
 
@@ -53,21 +50,15 @@ def get_census_block(lat, lon, retries=3):
         "State": {"FIPS": block["STATE"]},
         "Source": "Census Geocoder"
     }
-
-    _census_cache[key] = normalized
     return normalized
 
 
+@memoize(_revenue_cache, key=lambda lat, lon, *args, **kwargs: make_key(lat, lon))
 def revenue_estimation_by_dof_assessment(lat, lon, socrata_app_token):
     """
     Example pipeline: uses census block, then queries Socrata DOF dataset.
     Fully cached by (lat, lon).
     """
-
-    key = (round(lat, 6), round(lon, 6))
-    if key in _revenue_cache:
-        return _revenue_cache[key]
-
     block_info = get_census_block(lat, lon)
     fips = block_info["Block"]["FIPS"]
     print(f"✅ Got Census Block FIPS {fips} (source={block_info.get('Source','FCC')})")
@@ -77,10 +68,7 @@ def revenue_estimation_by_dof_assessment(lat, lon, socrata_app_token):
     headers = {"X-App-Token": socrata_app_token}
     params = {"$limit": 50, "bbl": fips[:10]}  # adapt schema as needed
 
-    resp = requests.get(url, headers=headers, params=params, timeout=10)
+    resp = Http.get(url, headers=headers, params=params, timeout=10)
     resp.raise_for_status()
     print(f'Revenue by dof response {resp}')
-    results = resp.json()
-
-    _revenue_cache[key] = results
-    return results
\ No newline at end of file
+    return resp.json()
\ No newline at end of file
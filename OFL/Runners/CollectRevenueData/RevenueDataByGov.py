@@ -1,17 +1,32 @@
 # parcel_sources.py
 # Python 3.10+
 from __future__ import annotations
-import os, time, urllib.parse, requests
+import json, math, os, time, urllib.parse, requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator
+import pandas as pd
+import pyarrow as pa
+from OFL.Cache import BoundedCache, memoize
+from OFL import Http
 
 HEADERS = {"User-Agent": "parcel-research/1.0 (+contact: you@example.com)"}
 REQ_TIMEOUT = 25
 
+# Parsed JSON responses of idempotent GETs
+_response_cache = BoundedCache("gov.responses", max_bytes=128 * 1024 * 1024, ttl=24 * 3600)
+
 # ---------------------------
 # Helpers
 # ---------------------------
 
+def _not_arcgis_error(data):
+    # ArcGIS reports failures as HTTP 200 with an {"error": ...} body; those must not stick for the TTL
+    return not (isinstance(data, dict) and "error" in data)
+
+@memoize(_response_cache, key=lambda url, params=None: (url, tuple(sorted((params or {}).items()))),
+         cacheable=_not_arcgis_error, copy_hits=True)
 def _get(url: str, params: dict | None = None):
-    r = requests.get(url, params=params, headers=HEADERS, timeout=REQ_TIMEOUT)
+    r = Http.get(url, params=params, headers=HEADERS, timeout=REQ_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -26,6 +41,185 @@ def _arcgis_query(base: str, layer: int = 0, **params):
     default.update(params)
     return _get(url, default)
 
+def _arcgis_point_query(base: str, lat: float, lon: float, layer: int = 0, out_fields: str = "*"):
+    """Point-in-parcel query with a WGS84 lat/lon (no client-side reprojection needed)."""
+    return _arcgis_query(
+        base, layer,
+        geometry=f"{lon},{lat}",
+        geometryType="esriGeometryPoint",
+        spatialRel="esriSpatialRelIntersects",
+        inSR=4326,
+        outFields=out_fields,
+        returnGeometry="false"
+    )
+
+# ---------------------------
+# Bulk export (auto-paginating, parallel)
+# ---------------------------
+
+# Esri field type -> Arrow type; anything unlisted is exported as string
+_ESRI_ARROW_TYPES = {
+    "esriFieldTypeOID": pa.int64(),
+    "esriFieldTypeInteger": pa.int64(),
+    "esriFieldTypeSmallInteger": pa.int32(),
+    "esriFieldTypeDouble": pa.float64(),
+    "esriFieldTypeSingle": pa.float32(),
+    "esriFieldTypeDate": pa.timestamp("ms"),
+}
+
+# Export pages are large and read once, so they bypass the response cache
+_get_uncached = _get.__wrapped__
+
+def _arcgis_layer_info(base: str, layer: int = 0) -> dict:
+    """Layer metadata: fields, maxRecordCount, objectIdField, pagination support."""
+    info = _get(base.rstrip("/") + f"/{layer}", {"f": "json"})
+    if "error" in info:
+        raise RuntimeError(f"ArcGIS layer info failed for {base}/{layer}: {info['error']}")
+    return info
+
+def _arcgis_page(url: str, params: dict) -> dict:
+    page = _get_uncached(url, params)
+    if "error" in page:
+        raise RuntimeError(f"ArcGIS query failed ({params}): {page['error']}")
+    return page
+
+def iter_arcgis_pages(base: str, layer: int = 0, where: str = "1=1", out_fields: str = "*",
+                      page_size: int | None = None, max_workers: int = 4, **params) -> Iterator[dict]:
+    """
+    Yield every page of a where-query, in completion order.
+
+    Discovers the record count and the layer's maxRecordCount, then fetches
+    pages with at most max_workers requests in flight: by resultOffset when
+    the layer supports pagination, otherwise by chunks of objectIds.
+    Extra params (outSR, returnGeometry, f, ...) are passed to every page request.
+    """
+    info = _arcgis_layer_info(base, layer)
+    url = base.rstrip("/") + f"/{layer}/query"
+    oid_field = info.get("objectIdField") or "OBJECTID"
+    page_size = min(page_size or info.get("maxRecordCount") or 1000, info.get("maxRecordCount") or 1000)
+
+    query = {"f": "json", "where": where, "outFields": out_fields, "returnGeometry": "true"}
+    query.update(params)
+
+    if info.get("advancedQueryCapabilities", {}).get("supportsPagination"):
+        count = _arcgis_page(url, {"f": "json", "where": where, "returnCountOnly": "true"}).get("count", 0)
+        print(f"Exporting {count} features from {url} in pages of {page_size}")
+        requests_ = ({**query, "orderByFields": oid_field, "resultOffset": off, "resultRecordCount": page_size}
+                     for off in range(0, count, page_size))
+    else:
+        ids = _arcgis_page(url, {"f": "json", "where": where, "returnIdsOnly": "true"}).get("objectIds") or []
+        ids.sort()
+        # objectIds go in the query string, so keep chunks well under URL limits
+        chunk = min(page_size, 200)
+        print(f"Exporting {len(ids)} features from {url} by objectIds in chunks of {chunk}")
+        requests_ = ({**query, "objectIds": ",".join(map(str, ids[i:i + chunk]))}
+                     for i in range(0, len(ids), chunk))
+
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for p in requests_:
+                pending.add(executor.submit(_arcgis_page, url, p))
+                if len(pending) >= max_workers * 2:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+def _arcgis_arrow_schema(info: dict, out_fields: str, geometry: bool) -> pa.Schema:
+    wanted = None if out_fields.strip() == "*" else {f.strip().lower() for f in out_fields.split(",")}
+    fields = [pa.field(f["name"], _ESRI_ARROW_TYPES.get(f["type"], pa.string()))
+              for f in info.get("fields", [])
+              if f["type"] != "esriFieldTypeGeometry" and (wanted is None or f["name"].lower() in wanted)]
+    if geometry:
+        fields.append(pa.field("geometry", pa.string()))  # Esri JSON geometry
+    return pa.schema(fields)
+
+def arcgis_record_batches(base: str, layer: int = 0, where: str = "1=1", out_fields: str = "*",
+                          geometry: bool = True, page_size: int | None = None, max_workers: int = 4,
+                          **params) -> Iterator[pa.RecordBatch]:
+    """
+    Bulk-export a layer as Arrow record batches (one per page) with a schema
+    taken from the layer's field definitions. Geometry, when requested, is an
+    Esri JSON string column. Write them out with pyarrow.parquet.ParquetWriter
+    or collect with pa.Table.from_batches.
+    """
+    schema = _arcgis_arrow_schema(_arcgis_layer_info(base, layer), out_fields, geometry)
+    names = [f.name for f in schema if f.name != "geometry"]
+    for page in iter_arcgis_pages(base, layer, where, out_fields, page_size, max_workers,
+                                  returnGeometry="true" if geometry else "false", **params):
+        feats = page.get("features", [])
+        if not feats:
+            continue
+        # Attribute keys come back with the layer's casing; match case-insensitively
+        rows = [{k.lower(): v for k, v in (f.get("attributes") or {}).items()} for f in feats]
+        cols = {n: [r.get(n.lower()) for r in rows] for n in names}
+        if geometry:
+            cols["geometry"] = [json.dumps(f["geometry"]) if f.get("geometry") else None for f in feats]
+        yield pa.RecordBatch.from_pydict(cols, schema=schema)
+
+# ---------------------------
+# Bulk Socrata (SoQL) lookups
+# ---------------------------
+
+# Budget for the url-encoded $where clause; keeps the whole request URL under common 8 KB limits
+SOQL_MAX_WHERE_LEN = 6000
+SOQL_PAGE_SIZE = 50000
+
+def _soql_quote(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _soql_where_chunks(terms: Iterable[str], joiner: str, wrap=lambda body: body,
+                       max_len: int = SOQL_MAX_WHERE_LEN) -> Iterator[str]:
+    """Pack terms into as few where clauses as fit in max_len once url-encoded."""
+    budget = max_len - len(urllib.parse.quote(wrap("")))
+    chunk, size = [], 0
+    for term in terms:
+        cost = len(urllib.parse.quote(term + joiner))
+        if chunk and size + cost > budget:
+            yield wrap(joiner.join(chunk))
+            chunk, size = [], 0
+        chunk.append(term)
+        size += cost
+    if chunk:
+        yield wrap(joiner.join(chunk))
+
+def _soql_fetch_all(url: str, where: str, headers: dict, select: str | None, page_size: int) -> list:
+    """All rows for one where clause, paged with $limit/$offset in a stable :id order."""
+    rows, offset = [], 0
+    while True:
+        params = {"$where": where, "$limit": page_size, "$offset": offset, "$order": ":id"}
+        if select:
+            params["$select"] = select
+        r = Http.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
+        r.raise_for_status()
+        page = r.json()
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+def _socrata_bulk(url: str, wheres: Iterable[str], app_token: str | None = None, select: str | None = None,
+                  max_workers: int = 4, page_size: int = SOQL_PAGE_SIZE) -> pd.DataFrame:
+    """Run where-clause chunks concurrently and return all rows as one DataFrame."""
+    headers = HEADERS.copy()
+    if app_token:
+        headers["X-App-Token"] = app_token
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_soql_fetch_all, url, w, headers, select, page_size) for w in wheres]
+        rows = [row for fut in futures for row in fut.result()]
+    print(f"Fetched {len(rows)} rows from {url} in {len(futures)} chunked queries")
+    return pd.DataFrame(rows)
+
+def socrata_where_in(url: str, field: str, ids: Iterable, app_token: str | None = None, select: str | None = None,
+                     max_workers: int = 4) -> pd.DataFrame:
+    """Bulk `field in (...)` lookup for any number of ids, chunked to stay under URL limits."""
+    terms = (_soql_quote(i) for i in dict.fromkeys(ids))
+    wheres = _soql_where_chunks(terms, ",", wrap=lambda body: f"{field} in ({body})")
+    return _socrata_bulk(url, wheres, app_token, select, max_workers)
+
 # ======================================================================
 # 1) LOS ANGELES COUNTY, CA  (Assessor PAIS + Map Books via ArcGIS)
 # REST folder index: https://assessor.gis.lacounty.gov/assessor/rest/services
@@ -72,6 +266,10 @@ def la_mapbook_by_tile(where: str = "1=1"):
     """Lookup Assessor Map Book tiles (helpful for indexing)."""
     return _arcgis_query(LA_MAPBOOKS_BASE, 0, where=where)
 
+def la_parcels_export(where: str = "1=1", out_fields: str = "*", **kwargs):
+    """Bulk export of the full PAIS parcels layer as Arrow record batches."""
+    return arcgis_record_batches(LA_PARCELS_FULL_BASE, 0, where, out_fields, **kwargs)
+
 # ======================================================================
 # 2) COOK COUNTY (CHICAGO), IL  (Assessor via Socrata Open Data)
 # Assessed values API: https://dev.socrata.com/foundry/datacatalog.cookcountyil.gov/uzyt-m557
@@ -90,7 +288,7 @@ def cook_assessed_values(pin14: str, app_token: str | None = None):
     headers = HEADERS.copy()
     if app_token:
         headers["X-App-Token"] = app_token
-    r = requests.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
+    r = Http.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -104,7 +302,37 @@ def cook_parcel_universe(pin14: str, app_token: str | None = None):
     headers = HEADERS.copy()
     if app_token:
         headers["X-App-Token"] = app_token
-    r = requests.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
+    r = Http.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+def cook_assessed_values_bulk(pins: Iterable[str], app_token: str | None = None, max_workers: int = 4):
+    """
+    Assessed values for many 14-digit PINs (uzyt-m557) in a handful of
+    chunked `pin in (...)` queries. Returns one DataFrame.
+    """
+    return socrata_where_in(f"{SOCRATA_BASE}/uzyt-m557.json", "pin", pins, app_token, max_workers=max_workers)
+
+def cook_parcel_universe_bulk(pins: Iterable[str], app_token: str | None = None, max_workers: int = 4):
+    """Parcel universe rows (nj4t-kc8j) for many PINs. Returns one DataFrame."""
+    return socrata_where_in(f"{SOCRATA_BASE}/nj4t-kc8j.json", "pin", pins, app_token, max_workers=max_workers)
+
+def cook_parcels_near_point(lat: float, lon: float, radius_m: float = 30, app_token: str | None = None):
+    """
+    Parcel universe rows (nj4t-kc8j) whose lat/lon falls in a small box around
+    the point. The Socrata API has no point-in-parcel query, so callers pick the nearest.
+    """
+    d_lat = radius_m / 111_320
+    d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+    url = f"{SOCRATA_BASE}/nj4t-kc8j.json"
+    params = {
+        "$where": f"lat between {lat - d_lat} and {lat + d_lat} and lon between {lon - d_lon} and {lon + d_lon}",
+        "$limit": 500,
+    }
+    headers = HEADERS.copy()
+    if app_token:
+        headers["X-App-Token"] = app_token
+    r = Http.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -146,6 +374,11 @@ def hcad_by_account(account: str):
     return _arcgis_query(HCAD_PARCELS_BASE, 0, where=f"owner_name_1 LIKE '%{account}%'", outFields="*")
 
 
+def hcad_parcels_export(where: str = "1=1", out_fields: str = "*", **kwargs):
+    """Bulk export of the HCAD parcels layer as Arrow record batches."""
+    return arcgis_record_batches(HCAD_PARCELS_BASE, 0, where, out_fields, **kwargs)
+
+
 def hcad_by_point(x_3857: float, y_3857: float):
     geom = {"x": x_3857, "y": y_3857, "spatialReference": {"wkid": 3857}}
     return _arcgis_query(
@@ -179,6 +412,10 @@ def maricopa_by_point(x_3857: float, y_3857: float):
         inSR=3857, outSR=3857
     )
 
+def maricopa_parcels_export(where: str = "1=1", out_fields: str = "*", **kwargs):
+    """Bulk export of the Maricopa parcels layer as Arrow record batches."""
+    return arcgis_record_batches(MARICOPA_PARCELS_BASE, 0, where, out_fields, **kwargs)
+
 def maricopa_treasurer_link(apn: str) -> str:
     """Direct treasurer detail page (HTML) for taxes/bills."""
     return f"https://treasurer.maricopa.gov/Parcel/?Parcel={urllib.parse.quote(apn)}"
@@ -205,6 +442,14 @@ def king_county_parcels_where(where: str, layer: int = 0, out_fields: str = "*",
         resultOffset=result_offset
     )
 
+def king_county_parcels_export(where: str = "1=1", out_fields: str = "*", layer: int = 0, **kwargs):
+    """Bulk export of the King County parcels FeatureService; pages are discovered and fetched for you."""
+    return arcgis_record_batches(KING_CO_PARCELS_FEATURESERVICE, layer, where, out_fields, **kwargs)
+
+def king_county_by_point(lat: float, lon: float, layer: int = 0):
+    """Point-in-parcel query against the King County parcels FeatureService."""
+    return _arcgis_point_query(KING_CO_PARCELS_FEATURESERVICE, lat, lon, layer)
+
 def king_county_by_parcel_id(parid: str):
     """Try common parcel id fields."""
     for field in ("PIN", "PARCELID", "PARCEL_ID", "TAXPARCELNUMBER"):
@@ -234,10 +479,28 @@ def nyc_dof_assessment_by_bbl(boro: int, block: int, lot: int, app_token: str |
     headers = HEADERS.copy()
     if app_token:
         headers["X-App-Token"] = app_token
-    r = requests.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
+    r = Http.get(url, params=params, headers=headers, timeout=REQ_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
+def _split_bbl(bbl) -> tuple[int, int, int]:
+    """10-digit BBL (int or str) or (boro, block, lot) -> (boro, block, lot)."""
+    if isinstance(bbl, (tuple, list)):
+        return int(bbl[0]), int(bbl[1]), int(bbl[2])
+    bbl = str(int(float(bbl))).zfill(10)
+    return int(bbl[0]), int(bbl[1:6]), int(bbl[6:10])
+
+def nyc_dof_assessments_by_bbl(bbls: Iterable, app_token: str | None = None, max_workers: int = 4):
+    """
+    DOF Property Valuation & Assessment rows (yjxr-fw8i) for many BBLs, given as
+    10-digit BBLs (e.g. MapPLUTO's bbl) or (boro, block, lot) tuples, in chunked
+    OR-of-triplets queries. Returns one DataFrame.
+    """
+    terms = (f"(boro={_soql_quote(b)} AND block={_soql_quote(bl)} AND lot={_soql_quote(l)})"
+             for b, bl, l in dict.fromkeys(_split_bbl(x) for x in bbls))
+    wheres = _soql_where_chunks(terms, " OR ")
+    return _socrata_bulk(f"{NYC_OD_BASE}/yjxr-fw8i.json", wheres, app_token, max_workers=max_workers)
+
 def nyc_property_tax_portal_link(boro: int, block: int, lot: int) -> str:
     """Direct link to DOF portal search-by-BBL (user must click through)."""
     return "https://a836-pts-access.nyc.gov/care/"
@@ -0,0 +1,93 @@
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Typed, city-partitioned Parquet dataset of collected training rows
+DATASET_NAME = "location_revenue_and_predictors"
+LEGACY_CSV = DATASET_NAME + ".csv"
+
+TRAIN_SCHEMA = pa.schema([
+    ("city", pa.string()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("population_density", pa.float64()),
+    ("osm_poi_density", pa.float64()),
+    ("fsq_poi_count", pa.float64()),
+    ("median_income", pa.float64()),
+    ("location_category_foursquare", pa.string()),
+    ("location_category_osm", pa.string()),
+    ("revenue", pa.float64()),
+])
+
+# Columns Train needs: numeric features, the raw category labels it encodes, and the target
+NUMERIC_FEATURES = ["population_density", "osm_poi_density", "fsq_poi_count", "median_income"]
+CATEGORY_COLUMNS = ["location_category_foursquare", "location_category_osm"]
+TARGET = "revenue"
+
+_PARTITIONING = ds.partitioning(pa.schema([("city", pa.string())]), flavor="hive")
+
+
+def dataset_path(dir_path):
+    return os.path.join(dir_path, DATASET_NAME)
+
+
+def to_table(df):
+    """Coerce collected rows into TRAIN_SCHEMA: missing columns become nulls, unparsable numbers become NaN."""
+    df = pd.DataFrame(df)
+    cols = {}
+    for field in TRAIN_SCHEMA:
+        col = df[field.name] if field.name in df else pd.Series([None] * len(df), dtype=object)
+        if pa.types.is_floating(field.type):
+            col = pd.to_numeric(col, errors="coerce").astype("float64")
+        else:
+            col = col.astype(object).where(col.notna(), None)
+        cols[field.name] = pa.array(col, type=field.type, from_pandas=True)
+    return pa.table(cols, schema=TRAIN_SCHEMA)
+
+
+def write_dataset(df, dir_path, max_rows_per_file=1_000_000):
+    """
+    Replace the Parquet dataset under dir_path with df, one hive partition
+    (city=...) per city. Written to a sibling directory first and swapped in.
+    Raises ValueError for an empty df, leaving any existing dataset untouched.
+    """
+    if len(df) == 0:
+        raise ValueError(f"Refusing to replace the dataset under {dir_path} with no rows")
+    path = dataset_path(dir_path)
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    ds.write_dataset(to_table(df), tmp, format="parquet", partitioning=_PARTITIONING,
+                     max_rows_per_file=max_rows_per_file, max_rows_per_group=min(max_rows_per_file, 128 * 1024),
+                     existing_data_behavior="error")
+    if not os.path.isdir(tmp):
+        raise RuntimeError(f"Writing {tmp} produced no files; {path} left unchanged")
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)  # stale copy from an interrupted swap
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def open_dataset(dir_path):
+    return ds.dataset(dataset_path(dir_path), schema=TRAIN_SCHEMA, format="parquet", partitioning=_PARTITIONING)
+
+
+def read_dataset(dir_path, columns=None, cities=None):
+    """
+    Read only the requested columns (all when None), optionally restricted to some
+    cities (partition pruning), with the schema's fixed dtypes.
+    """
+    flt = ds.field("city").isin(list(cities)) if cities else None
+    return open_dataset(dir_path).to_table(columns=columns, filter=flt).to_pandas()
+
+
+def iter_batches(dir_path, columns=None, batch_size=100_000, cities=None):
+    """Stream the dataset as DataFrames of at most batch_size rows, reading only the requested columns."""
+    flt = ds.field("city").isin(list(cities)) if cities else None
+    for batch in open_dataset(dir_path).to_batches(columns=columns, filter=flt, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
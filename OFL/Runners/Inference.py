@@ -1,21 +1,31 @@
 from OFL.Predictors.Categories import get_osm_category, get_foursquare_category
 from OFL.Predictors import Predictors, FoursquareQuery
-from OFL.Predictors.Categories import encode_location_categories
+from OFL.Predictors.Categories import encode_location_categories, CATEGORY_COLUMNS
 from OFL import Helpers
 import pandas as pd
 
+FEATURE_COLUMNS = ["population_density"
+    , "osm_poi_density"
+    , "fsq_poi_count"
+    , "median_income"
+    , "fsq_category_encoded"
+    , "osm_category_encoded"]
+NUMERIC_COLUMNS = FEATURE_COLUMNS[:4]  # the rest are category codes, which depend on the model's vocab
 
-def build_inference_features_for_location(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key):
+
+def _neighborhood_frame(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key):
+    """Raw (unencoded) features of every neighborhood sub-point of a location."""
     neighborhood_points = Predictors.generate_circle_points(lat, lon, radius_m, cr)
     print(f'Number of neighborhood points {len(neighborhood_points)}')
+    # Categories describe the location itself, so they are looked up once rather than per sub-point
+    osm_cat = get_osm_category(lat, lon)
+    fsq_cat = get_foursquare_category(lat, lon)
     features = []
     for (lat_i, lon_i) in neighborhood_points:
         pop = Helpers.get_population_density_gee(lat_i, lon_i, cr)
         osm_poi = Helpers.get_osm_poi_density(lat_i, lon_i, cr)
         fsq_poi = FoursquareQuery.get_fsq_count(lat_i, lon_i, cr, _fsq_query_cache, _fsq_duckdb_con)
         income = Predictors.get_median_income_by_point(lat_i, lon_i, cr, census_api_key)
-        osm_cat = get_osm_category(lat, lon)
-        fsq_cat = get_foursquare_category(lat, lon)
         features.append({
             "lat": lat_i,
             "lon": lon_i,
@@ -27,15 +37,41 @@ def build_inference_features_for_location(lat, lon, radius_m, cr, _fsq_duckdb_co
             "location_category_osm": osm_cat,
         })
 
-    df = pd.DataFrame(features)
+    return pd.DataFrame(features)
+
 
-    df_vars = encode_location_categories(df)
+def build_inference_features_for_location(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key,
+                                          vocab=None):
+    """vocab: the model's category vocabulary, so categories get the codes the model was trained with."""
+    df = _neighborhood_frame(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key)
+    df_vars = encode_location_categories(df, vocab)
     # Predictors/Features:
-    X = df_vars[["population_density"
-        , "osm_poi_density"
-        , "fsq_poi_count"
-        , "median_income"
-        , "fsq_category_encoded"
-        , "osm_category_encoded"]]
+    X = df_vars[FEATURE_COLUMNS]
 
     return X
+
+
+def raw_location_features(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key):
+    """
+    Model-independent features of a location: neighborhood means of the numeric
+    predictors plus the location's category labels (coded later by encode_features).
+    """
+    df = _neighborhood_frame(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key)
+    agg = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors="coerce").mean()
+    row = {col: float(agg[col]) for col in NUMERIC_COLUMNS}
+    for col in CATEGORY_COLUMNS:
+        row[col] = df[col].iat[0] if len(df) else None
+    return row
+
+
+def encode_features(df, vocab=None):
+    """Model input (FEATURE_COLUMNS) for raw feature rows, categories coded with the model's vocab."""
+    return encode_location_categories(df.copy(), vocab or None)[FEATURE_COLUMNS]
+
+
+def aggregate_location_features(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key,
+                                vocab=None):
+    """One model input row for a location: the mean of its neighborhood features."""
+    raw = raw_location_features(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache, census_api_key)
+    X = encode_features(pd.DataFrame([raw]), vocab)
+    return {col: float(X[col].iat[0]) for col in FEATURE_COLUMNS}
@@ -1,84 +1,100 @@
 import streamlit as st
-import requests
-import json
 import os
 import pandas as pd
-import joblib
-import ee
+import requests
 from OFL import Helpers
-from OFL.Runners.Inference import build_inference_features_for_location
+from OFL.Cache import cache_stats, clear_caches
+from OFL.Predictors import FoursquareQuery
+from OFL.Runners.Inference import raw_location_features, encode_features, FEATURE_COLUMNS
+from OFL.Runners.Ranking import rank_candidates
 from OFL.Predictors.Predictors import generate_city_candidate_locations
 from OFL.Runners.CollectRevenueData import Geocoding
-import pickle
-
-# Global caches for Foursquare(HF + Duckdb)
-global _fsq_duckdb_con
+from OFL.ModelArtifact import LinearPredictor, from_sklearn
+from OFL.ModelStore import ModelStore
+
+# Streamlit re-executes this script on every interaction. Everything expensive
+# lives in the cached functions below, which survive reruns, so a click only
+# pays for work it hasn't seen before. They are cleared from the sidebar, or
+# by the invalidation noted on each.
+
+# -----------------------
+# CONFIG
+# -----------------------
+HF_MODEL_REPO = "shaddie/ofl_revenue_predictor"
+HF_MODEL_FILENAME = "model.npz"  # Model artifact inside repo (see OFL.ModelArtifact), uploaded by Train --publish
+HF_LEGACY_MODEL_FILENAME = "model.joblib"  # sklearn model served until the .npz is published
+MODEL_ARTIFACT_PATH = "/Users/rckyi/Documents/Data/linear_regression_model.npz"  # written by Train
+
+# ------------------------
+# PARAMETERS
+# ------------------------
+CR = 10  # Subcircle radius
+RADIUS_C = 50  # Candidate facility radius (for city split)
+
+
+@st.cache_resource
+def get_fsq_resources():
+    """DuckDB connection and FSQ count cache shared by every session and rerun of this process."""
+    return Helpers.get_default_duckdb_connection(), FoursquareQuery._fsq_count_cache
+
+
+@st.cache_resource
+def load_model(artifact_mtime):
+    """
+    Local artifact from Train if present, else the published one from Hugging Face Hub
+    (through the content-addressed store: revalidated by ETag, last good copy when offline).
+    artifact_mtime is part of the cache key, so retraining reloads the model.
+    """
+    if artifact_mtime is not None:
+        return LinearPredictor.load(MODEL_ARTIFACT_PATH)
+    try:
+        return LinearPredictor.load(_fetch_hf(HF_MODEL_FILENAME))
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        print(f'{HF_MODEL_FILENAME} is not published in {HF_MODEL_REPO}; using {HF_LEGACY_MODEL_FILENAME}')
+    import joblib  # the legacy file is a pickled sklearn model
+    return from_sklearn(joblib.load(_fetch_hf(HF_LEGACY_MODEL_FILENAME)), FEATURE_COLUMNS)
+
+
+def _fetch_hf(filename):
+    url = f"https://huggingface.co/{HF_MODEL_REPO}/resolve/main/{filename}"
+    return ModelStore().fetch(f"{HF_MODEL_REPO}/{filename}", url)
+
+
+def current_model():
+    mtime = os.path.getmtime(MODEL_ARTIFACT_PATH) if os.path.exists(MODEL_ARTIFACT_PATH) else None
+    return load_model(mtime)
+
+
+@st.cache_data(show_spinner=False)
+def city_candidates(location_name, radius_c=RADIUS_C):
+    """Candidate facility locations for a city; computed only when a feature asks for them."""
+    return generate_city_candidate_locations(location_name, radius_c)
+
+
+def model_or_error():
+    """The current model, or None after showing why it couldn't be loaded."""
+    try:
+        return current_model()
+    except Exception as e:
+        st.error(f"Model could not be loaded: {e}")
+        return None
+
+
+@st.cache_data(show_spinner=False, max_entries=5_000)
+def location_features(lat, lon, radius_m, cr, census_api_key):
+    """
+    Raw features around one location, keyed on coordinates only: they don't
+    depend on the model, whose category codes are applied at predict time.
+    """
+    con, fsq_cache = get_fsq_resources()
+    return raw_location_features(lat, lon, radius_m, cr, con, fsq_cache, census_api_key)
 
 
 def main():
-    print(f'Starting the app... ')
-    # -----------------------
-    # CONFIG
-    # -----------------------
-    HF_MODEL_REPO = "shaddie/ofl_revenue_predictor"
-    HF_MODEL_FILENAME = "model.joblib"  # Model file inside repo
-
     CENSUS_API_KEY = st.secrets.get("CENSUS_API_KEY", "")  # use streamlit secrets to store and retrieve api
-    print(f'Obtained Census Api key ...')
-
-    print(f'Setting up EE connection...')
-    ee.Authenticate()
-    ee.Initialize(project='ee-shaddie77')
-    print(f'Google EE con initialized ...')
-
-    # ------------------------
-    # PARAMETERS
-    # ------------------------
-    radius_m = 100  # Neighborhood radius
-    cr = 10  # Subcircle radius
-    radius_c = 50  # Candidate facility radius (for city split)
-    location_name = "New York, NY"
-
-    # ------------------
-    # CACHING
-    # --------------------
-    _GEOCODE_CACHE_FILE = "/Users/rckyi/Documents/Data/geocode_cache.json"
-    _geocode_cache = {}
-    _GEOCODE_CACHE_EXPIRY_DAYS = 30  # <-- configurable expiry
-
-    # Load geocode cache if available
-    if os.path.exists(_GEOCODE_CACHE_FILE):
-        try:
-            with open(_GEOCODE_CACHE_FILE, "r") as f:
-                _geocode_cache = json.load(f)
-        except Exception:
-            _geocode_cache = {}
-
-    print(f'Connecting to Foursquare db: DuckDB + HF... ')
-    # Foursquare caching
-    _fsq_query_cache = {}
-    _fsq_duckdb_con = None
-    _fsq_duckdb_con = Helpers._get_duckdb_connection(_fsq_duckdb_con)
-
-    print(f'Foursquare db con established ...')
-
-    # --- Parameters
-
-    print(f'Getting candidates for the location')
-    candidates = generate_city_candidate_locations(location_name, radius_c)
-    print(f'size of candidates {len(candidates)}')
-    print(f'element of candidates {candidates[0]}')
-
-    @st.cache_resource
-    def load_model_from_hf():
-        """Download model from Hugging Face Hub."""
-        url = f"https://huggingface.co/{HF_MODEL_REPO}/resolve/main/{HF_MODEL_FILENAME}"
-        r = requests.get(url, timeout=30)
-        r.raise_for_status()
-        with open(HF_MODEL_FILENAME, "wb") as f:
-            f.write(r.content)
-        model_hf = joblib.load(HF_MODEL_FILENAME)
-        return model_hf
+    # Earth Engine is initialized on the first population lookup (OFL.Helpers.ensure_ee), not on every rerun
 
     # -----------------------
     # STREAMLIT UI
@@ -89,6 +105,22 @@ def main():
 
     if "locations" not in st.session_state:
         st.session_state.locations = []
+    if "estimates" not in st.session_state:
+        st.session_state.estimates = None
+    if "ranking" not in st.session_state:
+        st.session_state.ranking = None
+
+    with st.sidebar:
+        st.subheader("Caches")
+        if st.button("Reload model"):
+            load_model.clear()
+            st.session_state.estimates = None
+        if st.button("Clear feature caches"):
+            location_features.clear()
+            city_candidates.clear()
+            clear_caches()  # in-process population / POI / FSQ / geocode caches
+        with st.expander("Cache stats"):
+            st.json(cache_stats())
 
     # --- Form to add locations ---
     with st.form("add_loc"):
@@ -96,6 +128,19 @@ def main():
         radius_m = st.number_input("Radius (meters)", min_value=100, max_value=5000, value=500, step=50)
         submitted = st.form_submit_button("Add location")
 
+    # --- Form to add a batch of locations (one address per line) ---
+    with st.form("add_locs_batch"):
+        batch_names = st.text_area("Batch of locations / addresses (one per line)", "")
+        batch_radius_m = st.number_input("Radius (meters)", min_value=100, max_value=5000, value=500, step=50,
+                                         key="batch_radius_m")
+        batch_submitted = st.form_submit_button("Add locations")
+
+    def add_location(name, lat, lon, radius_m):
+        features = location_features(lat, lon, int(radius_m), CR, CENSUS_API_KEY)
+        st.session_state.locations.append({"location": name, "lat": lat, "lon": lon, "radius": radius_m,
+                                           **features})
+        st.session_state.estimates = None  # the table changed
+
     if submitted:
         try:
             lat, lon = Geocoding.geocode_direct(location_name)
@@ -103,80 +148,72 @@ def main():
         except Exception as e:
             st.error(f"Geocoding failed: {e}")
             st.stop()
-        print(f'compute predictors ...')
         with st.spinner("Computing Predictors..."):
-            X_df = build_inference_features_for_location(lat, lon
-                                                         , radius_m
-                                                         , cr
-                                                         , _fsq_duckdb_con
-                                                         , _fsq_query_cache
-                                                         , CENSUS_API_KEY)
-
-            agg = X_df.mean(numeric_only=True).to_dict()
-            st.session_state.locations.append(
-                {
-                    "population_density": agg["population_density"]
-                    , "osm_poi_density": agg["osm_poi_density"]
-                    , "fsq_poi_count": agg["osm_poi_density"]
-                    , "median_income": agg["median_income"]
-                    , "fsq_category_encoded": agg["fsq_category_encoded"]
-                    , "osm_category_encoded": agg["osm_category_encoded"]
-                }
-
-
-                # {
-                #     "location": location_name,
-                #     "lat": lat,
-                #     "lon": lon,
-                #     "radius": radius_m,
-                #     "population_density": agg["population_density"],
-                #     "osm_poi_density": agg["osm_poi_density"],
-                #     "median_income": agg["median_income"]
-                # }  # tbd: add categories data
-
-
-            )
+            add_location(location_name, lat, lon, radius_m)
+
+    if batch_submitted:
+        names = [n.strip() for n in batch_names.splitlines() if n.strip()]
+        with st.spinner(f"Geocoding and computing predictors for {len(names)} locations..."):
+            # Features for each address are computed as soon as its geocode arrives
+            for name, latlon, err in Geocoding.geocode_many(names):
+                if err is not None:
+                    st.warning(f"Geocoding failed: {err}")
+                    continue
+                print(f'Geocoded {name} lat, lon {latlon}')
+                add_location(name, latlon[0], latlon[1], batch_radius_m)
 
     # --- Display locations in a table ---
-    df = None
     if st.session_state.locations:
-        df = pd.DataFrame(st.session_state.locations)
         st.subheader("📋 Added Locations")
-        st.dataframe(df)
+        st.dataframe(pd.DataFrame(st.session_state.locations))
 
     # --- Button to run inference ---
-    if st.button("Run inference"):
-        with st.spinner("Loading pretrained model..."):
-            filename = "/Users/rckyi/Documents/Data/linear_regression_model.pkl"
-            # Load the model from the file
-            if os.path.exists(filename):
-                with open(filename, 'rb') as file:
-                    model = pickle.load(file)
-            else:
-                raise Exception("Failed to load model ...")
-
-        with st.spinner("Running inference..."):
-            print(f'columns are: {df.columns}')
-            feature_cols = ["population_density"
-                , "osm_poi_density"
-                , "fsq_poi_count"
-                , "median_income"
-                , "fsq_category_encoded"
-                , "osm_category_encoded"]  # tbd: update feature columns
-            df["estimated_revenue"] = model.predict(df[feature_cols])
-
+    if st.button("Run inference") and st.session_state.locations:
+        model = model_or_error()
+        if model is not None:
+            df = pd.DataFrame(st.session_state.locations)
+            with st.spinner("Running inference..."):
+                df[FEATURE_COLUMNS] = encode_features(df, model.vocab)
+                df["estimated_revenue"] = model.predict(df[FEATURE_COLUMNS])
+            st.session_state.estimates = df
+
+    if st.session_state.estimates is not None:
         st.subheader("💰 Revenue Estimates")
-        st.dataframe(df[["population_density"
-                , "osm_poi_density"
-                , "fsq_poi_count"
-                , "median_income"
-                , "fsq_category_encoded"
-                , "osm_category_encoded"
-                , "estimated_revenue"]])
+        st.dataframe(st.session_state.estimates[["location"] + FEATURE_COLUMNS + ["estimated_revenue"]])
+
+    # --- Rank every candidate site in a city ---
+    with st.form("rank_city"):
+        rank_city_name = st.text_input("City", "New York, NY")
+        rank_k = st.number_input("Top k sites", min_value=1, max_value=100, value=10)
+        rank_radius_m = st.number_input("Radius (meters)", min_value=100, max_value=5000, value=500, step=50,
+                                        key="rank_radius_m")
+        rank_submitted = st.form_submit_button("Rank city")
+
+    model = model_or_error() if rank_submitted else None
+    if model is not None:
+        candidates = city_candidates(rank_city_name)
+        con, fsq_cache = get_fsq_resources()
+        progress = st.progress(0.0, text=f"Scoring {len(candidates)} candidates...")
+        shortlist = st.empty()
+        top = None
+        # The shortlist is redrawn after every scored batch, so good sites show up before the scan ends
+        for done, total, top in rank_candidates(candidates, model, int(rank_radius_m), CR, CENSUS_API_KEY,
+                                                k=int(rank_k), _fsq_duckdb_con=con, _fsq_query_cache=fsq_cache):
+            progress.progress(done / max(total, 1), text=f"Scored {done}/{total} candidates")
+            shortlist.dataframe(top)
+        progress.empty()
+        shortlist.empty()
+        st.session_state.ranking = top
+
+    if st.session_state.ranking is not None:
+        st.subheader("🏆 Top Sites")
+        st.dataframe(st.session_state.ranking)
+        st.map(st.session_state.ranking[["lat", "lon"]])
 
     # Optional: clear button
     if st.button("Clear all locations"):
         st.session_state.locations.clear()
+        st.session_state.estimates = None
 
 
 # Call the main function
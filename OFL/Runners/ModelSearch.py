@@ -0,0 +1,148 @@
+import importlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from OFL.Helpers import tile_id
+from OFL.Lazy import LazyModule
+
+model_selection = LazyModule("sklearn.model_selection")
+
+# (name, estimator class path, constructor params). Scale-sensitive models get a StandardScaler first.
+SEARCH_SPACE = [
+    ("linear", "sklearn.linear_model.LinearRegression", {}),
+    *[(f"ridge_a{a:g}", "sklearn.linear_model.Ridge", {"alpha": a}) for a in (0.1, 1.0, 10.0, 100.0)],
+    *[(f"lasso_a{a:g}", "sklearn.linear_model.Lasso", {"alpha": a, "max_iter": 10_000}) for a in (1.0, 100.0)],
+    *[(f"hgb_d{d}_lr{lr:g}", "sklearn.ensemble.HistGradientBoostingRegressor",
+       {"max_depth": d, "learning_rate": lr, "random_state": 0}) for d in (3, 6) for lr in (0.05, 0.1)],
+    *[(f"rf_{n}", "sklearn.ensemble.RandomForestRegressor",
+       {"n_estimators": n, "min_samples_leaf": 5, "n_jobs": 1, "random_state": 0}) for n in (100, 300)],
+]
+_SCALED = ("sklearn.linear_model.Ridge", "sklearn.linear_model.Lasso")
+# Configurations OFL.ModelArtifact can export for the app
+_LINEAR = ("sklearn.linear_model.LinearRegression",) + _SCALED
+
+# Worker-side views of the shared design matrix (set by _attach)
+_shared = {}
+
+
+def spatial_folds(lats, lons, n_folds=5, tile_m=1000):
+    """
+    (train_idx, test_idx) pairs with whole tiles held out together, so a test
+    candidate's neighbors (which share most of its features) are never in training.
+    """
+    tiles = [tile_id(a, b, tile_m) for a, b in zip(lats, lons)]
+    groups = pd.factorize(pd.Series(tiles))[0]
+    n_folds = min(n_folds, len(np.unique(groups)))
+    if n_folds < 2:
+        raise ValueError(f"Need at least 2 distinct {tile_m:g} m tiles for spatial CV")
+    return list(model_selection.GroupKFold(n_splits=n_folds).split(np.zeros(len(groups)), groups=groups))
+
+
+def make_estimator(class_path, params):
+    module, name = class_path.rsplit(".", 1)
+    est = getattr(importlib.import_module(module), name)(**params)
+    if class_path in _SCALED:
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        est = make_pipeline(StandardScaler(), est)
+    return est
+
+
+def _share(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach(specs):
+    """Pool initializer: map the shared X and y into this worker without copying."""
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key + "_shm"] = shm  # keep the mapping alive
+        _shared[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def evaluate_config(config, folds):
+    """Cross-validate one configuration on the shared data. Returns a report row."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    name, class_path, params = config
+    X, y = _shared["X"], _shared["y"]
+    start = time.time()
+    rmse, mae, r2, fit_s = [], [], [], 0.0
+    for train_idx, test_idx in folds:
+        est = make_estimator(class_path, params)
+        t = time.time()
+        est.fit(X[train_idx], y[train_idx])
+        fit_s += time.time() - t
+        pred = est.predict(X[test_idx])
+        rmse.append(np.sqrt(mean_squared_error(y[test_idx], pred)))
+        mae.append(mean_absolute_error(y[test_idx], pred))
+        r2.append(r2_score(y[test_idx], pred))
+    return {"config": name, "estimator": class_path.rsplit(".", 1)[1], "params": params,
+            "rmse_mean": float(np.mean(rmse)), "rmse_std": float(np.std(rmse)),
+            "mae_mean": float(np.mean(mae)), "r2_mean": float(np.mean(r2)),
+            "fit_seconds": fit_s, "total_seconds": time.time() - start, "worker_pid": os.getpid()}
+
+
+def model_search(X, y, lats, lons, search_space=SEARCH_SPACE, n_folds=5, tile_m=1000, workers=None):
+    """
+    Evaluate every configuration in search_space with spatially blocked CV, in
+    parallel. X and y are encoded once and placed in shared memory; each worker
+    maps them instead of receiving a copy. Returns the report ranked by mean RMSE.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    folds = spatial_folds(lats, lons, n_folds, tile_m)
+    print(f'Model search: {len(search_space)} configs x {len(folds)} spatial folds on {len(y)} rows')
+
+    x_shm, x_spec = _share(X)
+    y_shm, y_spec = _share(y)
+    rows, failed = [], []
+    start = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_attach,
+                                 initargs=({"X": x_spec, "y": y_spec},)) as executor:
+            futures = {executor.submit(evaluate_config, cfg, folds): cfg[0] for cfg in search_space}
+            for fut in as_completed(futures):
+                try:
+                    row = fut.result()
+                except Exception as e:
+                    print(f'{futures[fut]} failed: {e}')
+                    failed.append(f"{futures[fut]} ({e})")
+                    continue
+                print(f"{row['config']}: RMSE {row['rmse_mean']:.1f} (+/- {row['rmse_std']:.1f}), "
+                      f"R2 {row['r2_mean']:.3f}, {row['total_seconds']:.1f}s")
+                rows.append(row)
+    finally:
+        for shm in (x_shm, y_shm):
+            shm.close()
+            shm.unlink()
+
+    if not rows:
+        raise RuntimeError(f"Model search: all {len(search_space)} configurations failed: {'; '.join(failed)}")
+    report = pd.DataFrame(rows).sort_values("rmse_mean").reset_index(drop=True)
+    report.insert(0, "rank", range(1, len(report) + 1))
+    print(f'Model search finished in {time.time() - start:.1f}s')
+    return report
+
+
+def best_config(report, search_space=SEARCH_SPACE, linear_only=False):
+    """Name of the top-ranked configuration (top-ranked linear one with linear_only); None if there is none."""
+    by_name = {cfg[0]: cfg for cfg in search_space}
+    for name in report["config"]:
+        if name in by_name and (not linear_only or by_name[name][1] in _LINEAR):
+            return name
+    return None
+
+
+def best_estimator(report, search_space=SEARCH_SPACE, linear_only=False):
+    """Unfitted estimator for the top-ranked (linear) configuration."""
+    by_name = {cfg[0]: cfg for cfg in search_space}
+    name = best_config(report, search_space, linear_only)
+    if name is None:
+        raise ValueError(f"No {'linear ' if linear_only else ''}configuration in the report")
+    _, class_path, params = by_name[name]
+    return make_estimator(class_path, params)
@@ -0,0 +1,335 @@
+import argparse
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+import pandas as pd
+from OFL import Helpers
+from OFL.ModelArtifact import LinearPredictor
+from OFL.Predictors import FoursquareQuery, Predictors
+from OFL.Runners.Inference import aggregate_location_features, FEATURE_COLUMNS
+
+RANK_COLUMNS = ["lat", "lon"] + FEATURE_COLUMNS + ["estimated_revenue"]
+# Features computed from local data only (the FSQ parquet); stage one of the cascade
+CHEAP_FEATURES = ["fsq_poi_count"]
+
+
+class TopK:
+    """Best k rows by score seen so far (min-heap of size k)."""
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._seq = 0  # tie-breaker so rows are never compared
+
+    def push(self, score, row):
+        item = (score, self._seq, row)
+        self._seq += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    def threshold(self):
+        """Score a row must beat to enter the top-k (-inf until k rows are in)."""
+        return self._heap[0][0] if len(self._heap) == self.k else -np.inf
+
+    def frame(self):
+        rows = [row for _, _, row in sorted(self._heap, key=lambda x: (-x[0], x[1]))]
+        return pd.DataFrame(rows, columns=RANK_COLUMNS)
+
+
+def _thread_cursor(con, local):
+    """Per-thread DuckDB cursor: one connection object must not run queries from several threads."""
+    if not hasattr(local, "cursor"):
+        local.cursor = (con or Helpers.get_default_duckdb_connection()).cursor()
+    return local.cursor
+
+
+def _featurize(candidates, fn, max_workers=4):
+    """
+    Run fn over candidates in a thread pool; yields (point, result, error) in completion order.
+    At most 2 * max_workers candidates are in flight, so closing the generator early
+    (a Streamlit rerun, Ctrl-C) only waits for those, not for the rest of the city.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    todo = iter(candidates)
+    in_flight = {}
+    try:
+        while True:
+            for p in itertools.islice(todo, 2 * max_workers - len(in_flight)):
+                in_flight[executor.submit(fn, p)] = p
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                point = in_flight.pop(fut)
+                try:
+                    yield point, fut.result(), None
+                except Exception as e:
+                    yield point, None, e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _location_features(model, radius_m, cr, census_api_key, _fsq_duckdb_con, _fsq_query_cache):
+    """features(point) -> model input row for one candidate, safe to call from pool threads."""
+    if _fsq_query_cache is None:
+        _fsq_query_cache = FoursquareQuery._fsq_count_cache
+    vocab = getattr(model, "vocab", None)
+    local = threading.local()
+
+    def features(point):
+        lat, lon = point
+        row = aggregate_location_features(lat, lon, radius_m, cr, _thread_cursor(_fsq_duckdb_con, local),
+                                          _fsq_query_cache, census_api_key, vocab)
+        row["lat"], row["lon"] = lat, lon
+        return row
+
+    return features
+
+
+def score_candidates(candidates, model, radius_m=100, cr=10, census_api_key="", max_workers=4,
+                     _fsq_duckdb_con=None, _fsq_query_cache=None):
+    """
+    Features and predicted revenue for every candidate, without partial
+    rankings: one predict over all rows. Returns a DataFrame (RANK_COLUMNS)
+    sorted by estimated_revenue; failed candidates are left out.
+    """
+    features = _location_features(model, radius_m, cr, census_api_key, _fsq_duckdb_con, _fsq_query_cache)
+    rows = []
+    for point, row, err in _featurize(candidates, features, max_workers):
+        if err is not None:
+            print(f'Candidate {point} failed: {err}')
+        elif not any(pd.isna(row[c]) for c in FEATURE_COLUMNS):
+            rows.append(row)
+    df = pd.DataFrame(rows, columns=RANK_COLUMNS)
+    df["estimated_revenue"] = model.predict(df[FEATURE_COLUMNS]) if len(df) else []
+    print(f'Scored {len(df)}/{len(candidates)} candidates')
+    return df.sort_values("estimated_revenue", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def rank_candidates(candidates, model, radius_m=100, cr=10, census_api_key="", k=10, batch_size=32,
+                    max_workers=4, _fsq_duckdb_con=None, _fsq_query_cache=None):
+    """
+    Score every (lat, lon) candidate and yield progress as features complete:
+    (n_done, n_total, top-k DataFrame so far). Features are computed
+    concurrently; every batch_size finished candidates are scored with one
+    vectorized predict and merged into the running top-k. The last yield
+    re-scores the full feature matrix in one predict and is the final ranking.
+    Candidates whose features fail are skipped.
+    """
+    features = _location_features(model, radius_m, cr, census_api_key, _fsq_duckdb_con, _fsq_query_cache)
+    total = len(candidates)
+    top = TopK(k)
+    done, failed, pending = 0, 0, []
+    all_rows = []
+
+    def score(rows):
+        X = pd.DataFrame(rows)[FEATURE_COLUMNS]
+        for row, y in zip(rows, model.predict(X)):
+            row["estimated_revenue"] = float(y)
+            top.push(float(y), row)
+
+    start = time.time()
+    for point, row, err in _featurize(candidates, features, max_workers):
+        done += 1
+        if err is not None:
+            failed += 1
+            print(f'Candidate {point} failed: {err}')
+            continue
+        if any(pd.isna(row[c]) for c in FEATURE_COLUMNS):
+            failed += 1
+            continue
+        pending.append(row)
+        all_rows.append(row)
+        if len(pending) >= batch_size:
+            score(pending)
+            pending = []
+            yield done, total, top.frame()
+    if pending:
+        score(pending)
+
+    # Final: all candidates in one predict
+    final = TopK(k)
+    if all_rows:
+        X = pd.DataFrame(all_rows)[FEATURE_COLUMNS]
+        for row, y in zip(all_rows, model.predict(X)):
+            final.push(float(y), {**row, "estimated_revenue": float(y)})
+    print(f'Ranked {len(all_rows)}/{total} candidates ({failed} failed) in {time.time() - start:.1f}s')
+    yield total, total, final.frame()
+
+
+def rank_city(city_name, model, radius_c=50, **kwargs):
+    """rank_candidates over the candidate grid of a city (see generate_city_candidate_locations)."""
+    candidates = Predictors.generate_city_candidate_locations(city_name, radius_c)
+    print(f'size of candidates for {city_name}: {len(candidates)}')
+    yield from rank_candidates(candidates, model, **kwargs)
+
+
+# -----------------------
+# Two-stage cascade: a proxy model on cheap local features prunes the
+# candidates, and only the survivors get the remote features (GEE, ACS, OSM).
+# -----------------------
+def cheap_location_features(lat, lon, radius_m, cr, _fsq_duckdb_con, _fsq_query_cache):
+    """
+    Neighborhood mean of the FSQ counts, over the same sub-points as the full
+    features, so stage two finds these counts already cached.
+    """
+    points = Predictors.generate_circle_points(lat, lon, radius_m, cr)
+    counts = [FoursquareQuery.get_fsq_count(a, b, cr, _fsq_query_cache, _fsq_duckdb_con) for a, b in points]
+    return {"fsq_poi_count": float(np.mean(counts))}
+
+
+def model_proxy(model, features=CHEAP_FEATURES):
+    """Proxy from the full model's own coefficients on the cheap features (needs no training data)."""
+    idx = [model.feature_names.index(f) for f in features]
+    return LinearPredictor(model.coef[idx], model.intercept, features, meta={"proxy": "model"})
+
+
+def fit_proxy(data_dir_path, features=CHEAP_FEATURES):
+    """Least-squares proxy of revenue on the cheap features, fit on the training dataset."""
+    from OFL.Runners.Dataset import read_dataset, TARGET
+    df = read_dataset(data_dir_path, columns=features + [TARGET]).dropna()
+    A = np.column_stack([df[features].to_numpy(dtype=np.float64), np.ones(len(df))])
+    sol = np.linalg.lstsq(A, df[TARGET].to_numpy(dtype=np.float64), rcond=None)[0]
+    print(f'Fit proxy on {len(df)} rows: coef {sol[:-1]}, intercept {sol[-1]:.1f}')
+    return LinearPredictor(sol[:-1], sol[-1], features, meta={"proxy": "fit", "rows": len(df)})
+
+
+def proxy_scores(candidates, proxy, radius_m=100, cr=10, max_workers=4, _fsq_duckdb_con=None,
+                 _fsq_query_cache=None):
+    """Stage one: cheap features and proxy score for every candidate (failures dropped)."""
+    if _fsq_query_cache is None:
+        _fsq_query_cache = FoursquareQuery._fsq_count_cache
+    local = threading.local()
+
+    def features(point):
+        return cheap_location_features(point[0], point[1], radius_m, cr, _thread_cursor(_fsq_duckdb_con, local),
+                                       _fsq_query_cache)
+
+    rows = []
+    for point, row, err in _featurize(candidates, features, max_workers):
+        if err is not None:
+            print(f'Candidate {point} failed in stage one: {err}')
+            continue
+        rows.append({"lat": point[0], "lon": point[1], **row})
+    scored = pd.DataFrame(rows, columns=["lat", "lon"] + list(proxy.feature_names))
+    scored["proxy_score"] = proxy.predict(scored) if len(scored) else []
+    return scored
+
+
+def survivors(scored, keep_fraction, k):
+    """Top keep_fraction of the stage-one scores (never fewer than k)."""
+    n_keep = min(len(scored), max(k, math.ceil(keep_fraction * len(scored))))
+    return scored.nlargest(n_keep, "proxy_score")
+
+
+def cascade_rank(candidates, model, proxy=None, keep_fraction=0.2, radius_m=100, cr=10, census_api_key="", k=10,
+                 batch_size=32, max_workers=4, _fsq_duckdb_con=None, _fsq_query_cache=None):
+    """
+    rank_candidates on only the keep_fraction of candidates the proxy (default:
+    model_proxy(model)) ranks highest. Yields the same progress tuples, counted
+    over the survivors.
+    """
+    proxy = proxy or model_proxy(model)
+    start = time.time()
+    scored = proxy_scores(candidates, proxy, radius_m, cr, max_workers, _fsq_duckdb_con, _fsq_query_cache)
+    kept = survivors(scored, keep_fraction, k)
+    print(f'Stage one: scored {len(scored)}/{len(candidates)} candidates in {time.time() - start:.1f}s, '
+          f'keeping {len(kept)}')
+    yield from rank_candidates(list(zip(kept["lat"], kept["lon"])), model, radius_m, cr, census_api_key, k,
+                               batch_size, max_workers, _fsq_duckdb_con, _fsq_query_cache)
+
+
+def evaluate_cascade(candidates, model, proxy=None, keep_fractions=(0.05, 0.1, 0.2, 0.5), radius_m=100, cr=10,
+                     census_api_key="", k=10, max_workers=4, _fsq_duckdb_con=None, _fsq_query_cache=None):
+    """
+    Recall of the cascade's top-k against a full scan, per keep fraction.
+    Runs stage one and the full scan once; a fraction's cascade top-k is the
+    best k of the full-scan rows among its survivors (the features are the
+    same ones stage two would compute). Seconds are estimated from the two
+    measured passes: stage one + the full scan's per-candidate time x survivors.
+    """
+    proxy = proxy or model_proxy(model)
+    start = time.time()
+    scored = proxy_scores(candidates, proxy, radius_m, cr, max_workers, _fsq_duckdb_con, _fsq_query_cache)
+    stage1_s = time.time() - start
+    start = time.time()
+    full = score_candidates(candidates, model, radius_m, cr, census_api_key, max_workers, _fsq_duckdb_con,
+                            _fsq_query_cache)
+    # The full scan found the FSQ counts cached by stage one, so its time is the remote-feature cost
+    stage2_s = time.time() - start
+    full_keys = list(zip(full["lat"], full["lon"]))
+    true_top = set(full_keys[:k])
+
+    rows = []
+    for fraction in keep_fractions:
+        kept = survivors(scored, fraction, k)
+        kept_keys = set(zip(kept["lat"], kept["lon"]))
+        found = [key for key in full_keys if key in kept_keys][:k]
+        seconds = stage1_s + stage2_s * len(kept) / max(len(candidates), 1)
+        rows.append({"keep_fraction": fraction, "survivors": len(kept),
+                     "recall_at_k": len(true_top.intersection(found)) / max(len(true_top), 1),
+                     "est_seconds": seconds, "speedup": (stage1_s + stage2_s) / seconds if seconds else np.nan})
+    report = pd.DataFrame(rows)
+    print(f'Full scan of {len(candidates)} candidates: {stage1_s + stage2_s:.1f}s '
+          f'(stage one {stage1_s:.1f}s)\n{report.to_string(index=False)}')
+    return report
+
+
+def main(argv=None):
+    """
+    Top-k revenue sites of a city, printing the shortlist as it improves.
+        python -m OFL.Runners.Ranking "New York, NY" --k 10
+        python -m OFL.Runners.Ranking "New York, NY" --k 10 --cascade 0.2
+        python -m OFL.Runners.Ranking "New York, NY" --k 10 --evaluate-cascade 0.05 0.1 0.2 0.5
+    """
+    import streamlit as st
+    parser = argparse.ArgumentParser(description="Rank every candidate site in a city by predicted revenue")
+    parser.add_argument("city")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--radius-m", type=float, default=100, help="neighborhood radius")
+    parser.add_argument("--radius-c", type=float, default=50, help="candidate facility radius (grid spacing)")
+    parser.add_argument("--workers", type=int, default=4, help="candidates featurized concurrently")
+    parser.add_argument("--batch-size", type=int, default=32, help="candidates per partial ranking")
+    parser.add_argument("--model", default="/Users/rckyi/Documents/Data/linear_regression_model.npz")
+    parser.add_argument("--out", default="/Users/rckyi/Documents/Data/")
+    parser.add_argument("--cascade", type=float, default=None, metavar="FRACTION",
+                        help="prune with the cheap-feature proxy first, keeping this fraction of candidates")
+    parser.add_argument("--proxy-data", default=None, help="fit the proxy on this training data dir "
+                                                           "(default: the model's own cheap-feature coefficients)")
+    parser.add_argument("--evaluate-cascade", type=float, nargs="+", default=None, metavar="FRACTION",
+                        help="report cascade recall@k and estimated time against a full scan for these fractions")
+    args = parser.parse_args(argv)
+
+    model = LinearPredictor.load(args.model)
+    proxy = fit_proxy(args.proxy_data) if args.proxy_data else None
+    census_api_key = st.secrets.get("CENSUS_API_KEY", "")
+    candidates = Predictors.generate_city_candidate_locations(args.city, args.radius_c)
+    print(f'size of candidates for {args.city}: {len(candidates)}')
+    if args.evaluate_cascade:
+        evaluate_cascade(candidates, model, proxy, args.evaluate_cascade, args.radius_m,
+                         census_api_key=census_api_key, k=args.k, max_workers=args.workers)
+        return
+    if args.cascade is not None:
+        ranking = cascade_rank(candidates, model, proxy, args.cascade, args.radius_m, census_api_key=census_api_key,
+                               k=args.k, batch_size=args.batch_size, max_workers=args.workers)
+    else:
+        ranking = rank_candidates(candidates, model, args.radius_m, census_api_key=census_api_key, k=args.k,
+                                  batch_size=args.batch_size, max_workers=args.workers)
+    top = None
+    for done, total, top in ranking:
+        print(f'[{done}/{total}] current top {len(top)}:\n{top[["lat", "lon", "estimated_revenue"]].to_string()}')
+    if top is not None:
+        path = os.path.join(args.out, f"top_{args.k}_{args.city.split(',')[0].replace(' ', '_')}.csv")
+        top.to_csv(path, index=False)
+        print(f'Saved ranking to {path}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import heapq
+import math
+import time
+import numpy as np
+import pandas as pd
+from OFL.Gazetteer import _to_unit_xyz, _EARTH_RADIUS_M
+from OFL.Lazy import LazyModule
+
+spatial = LazyModule("scipy.spatial")
+
+# Pairs further apart than this many decay lengths are left out of the neighbor
+# graph (their penalty weight exp(-d / decay) is below 1%).
+CUTOFF_DECAYS = 4.6
+
+
+def _chord(distance_m):
+    return 2 * math.sin(min(distance_m / (2 * _EARTH_RADIUS_M), math.pi / 2))
+
+
+class NeighborGraph:
+    """
+    Sparse symmetric cannibalization weights between candidates:
+        w_ij = penalty * min(r_i, r_j) * exp(-d_ij / decay_m)   for d_ij <= cutoff_m
+    i.e. two sites d_ij apart lose that share of the smaller one's revenue.
+    Rows come from KD-tree radius queries and are only built for the sites the
+    solver actually picks, so cost scales with k, not with the number of pairs.
+    """
+
+    def __init__(self, lats, lons, revenue, decay_m=500, penalty=0.5, cutoff_m=None):
+        self.revenue = np.asarray(revenue, dtype=np.float64)
+        self.decay_m = decay_m
+        self.penalty = penalty
+        self._xyz = _to_unit_xyz(lats, lons)
+        self._tree = spatial.cKDTree(self._xyz)
+        self._radius = _chord(cutoff_m if cutoff_m is not None else CUTOFF_DECAYS * decay_m)
+
+    def row(self, i):
+        """(neighbor indices, weights) of candidate i, excluding i itself."""
+        j = np.asarray(self._tree.query_ball_point(self._xyz[i], self._radius), dtype=np.int64)
+        j = j[j != i]
+        d = 2 * np.arcsin(np.clip(np.linalg.norm(self._xyz[j] - self._xyz[i], axis=1) / 2, 0, 1)) * _EARTH_RADIUS_M
+        return j, self.penalty * np.minimum(self.revenue[i], self.revenue[j]) * np.exp(-d / self.decay_m)
+
+
+def lazy_greedy(revenue, graph, k):
+    """
+    Greedy maximization of  sum_{i in S} r_i - sum_{i<j in S} w_ij  with |S| <= k.
+    The objective is submodular (pairwise penalties only shrink a site's gain as
+    S grows), so a gain popped from the heap is an upper bound: it is recomputed
+    only if a neighbor was chosen since it was pushed. Stops early when no site
+    adds positive revenue. Returns (selected indices in order, gains).
+    """
+    penalty = np.zeros(len(revenue))  # sum of w_ij to the selected sites
+    version = np.zeros(len(revenue), dtype=np.int64)  # bumped whenever penalty[i] changes
+    heap = [(-r, i, 0) for i, r in enumerate(revenue)]
+    heapq.heapify(heap)
+    chosen = np.zeros(len(revenue), dtype=bool)
+    selected, gains = [], []
+    while heap and len(selected) < k:
+        neg_gain, i, v = heapq.heappop(heap)
+        if chosen[i]:
+            continue
+        if v != version[i]:
+            heapq.heappush(heap, (-(revenue[i] - penalty[i]), i, version[i]))
+            continue
+        if -neg_gain <= 0:
+            break
+        chosen[i] = True
+        selected.append(i)
+        gains.append(-neg_gain)
+        nbrs, w = graph.row(i)
+        penalty[nbrs] += w
+        version[nbrs] += 1
+    return selected, gains
+
+
+def select_sites(scored, k, decay_m=500, penalty=0.5, capacity=None, revenue_col="estimated_revenue"):
+    """
+    Pick up to k sites from scored candidates (DataFrame with lat, lon and
+    revenue_col), maximizing total predicted revenue net of cannibalization
+    between chosen sites (see NeighborGraph). capacity caps the revenue a
+    single site can realize. Returns (chosen sites in selection order with
+    their marginal gain, summary dict).
+    """
+    start = time.time()
+    scored = scored.dropna(subset=["lat", "lon", revenue_col]).reset_index(drop=True)
+    revenue = scored[revenue_col].to_numpy(dtype=np.float64)
+    if capacity is not None:
+        revenue = np.minimum(revenue, capacity)
+    graph = NeighborGraph(scored["lat"].to_numpy(), scored["lon"].to_numpy(), revenue, decay_m, penalty)
+    selected, gains = lazy_greedy(revenue, graph, k)
+    sites = scored.iloc[selected].copy()
+    sites["realized_revenue"] = revenue[selected]
+    sites["marginal_gain"] = gains
+    summary = {"candidates": len(scored), "selected": len(selected),
+               "revenue": float(revenue[selected].sum()), "objective": float(sum(gains)),
+               "seconds": time.time() - start}
+    summary["cannibalization"] = summary["revenue"] - summary["objective"]
+    print(f"Selected {summary['selected']}/{summary['candidates']} sites: objective {summary['objective']:.1f} "
+          f"(revenue {summary['revenue']:.1f} - cannibalization {summary['cannibalization']:.1f}) "
+          f"in {summary['seconds']:.2f}s")
+    return sites.reset_index(drop=True), summary
+
+
+def main(argv=None):
+    """
+    Choose k facility sites from a scored candidate file (e.g. a Ranking output with a large --k).
+        python -m OFL.Runners.SiteSelection top_100000_New_York.csv --k 20 --decay-m 800
+    """
+    parser = argparse.ArgumentParser(description="Select k sites maximizing revenue net of cannibalization")
+    parser.add_argument("scored", help="CSV with lat, lon and estimated_revenue columns")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--decay-m", type=float, default=500, help="distance over which cannibalization decays")
+    parser.add_argument("--penalty", type=float, default=0.5, help="share of revenue lost by two co-located sites")
+    parser.add_argument("--capacity", type=float, default=None, help="max revenue one site can realize")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+
+    scored = pd.read_csv(args.scored)
+    sites, _ = select_sites(scored, args.k, args.decay_m, args.penalty, args.capacity)
+    print(sites[["lat", "lon", "estimated_revenue", "marginal_gain"]].to_string())
+    out = args.out or args.scored.replace(".csv", f"_selected_{args.k}.csv")
+    sites.to_csv(out, index=False)
+    print(f'Saved selection to {out}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,35 @@
+import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from OFL.Predictors.Categories import encode_location_categories
+from OFL.Lazy import LazyModule
+from OFL.Predictors.Categories import encode_location_categories, category_vocab
+from OFL.ModelArtifact import export_linear_model
+from OFL.Runners.Dataset import (read_dataset, iter_batches, dataset_path, NUMERIC_FEATURES, CATEGORY_COLUMNS,
+                                 TARGET, LEGACY_CSV)
+from OFL.Runners.ModelSearch import model_search, best_config, best_estimator
+import argparse
+import os
 import time
-from huggingface_hub import notebook_login
 import json, ast
 import pickle
 
+linear_model = LazyModule("sklearn.linear_model")
 
-def build_xy(data_dir_path):
-    file = "location_revenue_and_predictors.csv"
-    df = pd.read_csv(data_dir_path + file)
+HF_MODEL_REPO = "shaddie/ofl_revenue_predictor"  # where InferenceApp downloads the model when no local artifact
+HF_MODEL_FILENAME = "model.npz"
+
+
+def build_xy(data_dir_path, cities=None, with_coords=False):
+    """
+    Reads only the feature, category and revenue columns of the Parquet dataset
+    (optionally some cities). Falls back to the legacy csv if there is no dataset yet.
+    with_coords also returns the rows' lat/lon (for spatial CV).
+    """
+    columns = NUMERIC_FEATURES + CATEGORY_COLUMNS + [TARGET] + (["lat", "lon"] if with_coords else [])
+    if os.path.isdir(dataset_path(data_dir_path)):
+        df = read_dataset(data_dir_path, columns=columns, cities=cities)
+    else:
+        df = pd.read_csv(os.path.join(data_dir_path, LEGACY_CSV), usecols=lambda c: c in columns,
+                         dtype={c: "float64" for c in NUMERIC_FEATURES + [TARGET]})
     df_vars = encode_location_categories(df)
     X = df_vars[["population_density"
         , "osm_poi_density"
@@ -17,15 +37,115 @@ def build_xy(data_dir_path):
         , "median_income"
         , "fsq_category_encoded"
         , "osm_category_encoded"]]
-    y = df_vars["revenue"].apply(float)
+    y = df_vars[TARGET]
     print(f'y {y}')
 
+    if with_coords:
+        return X, y, df_vars[["lat", "lon"]]
     return X, y
 
 
+FEATURES = NUMERIC_FEATURES + ["fsq_category_encoded", "osm_category_encoded"]
+
+
+def iter_chunks(data_dir_path, batch_size=100_000, cities=None, columns=None):
+    """Feature/category/revenue columns (or just columns) of the dataset in chunks (legacy csv when there is no dataset)."""
+    columns = columns or NUMERIC_FEATURES + CATEGORY_COLUMNS + [TARGET]
+    if os.path.isdir(dataset_path(data_dir_path)):
+        yield from iter_batches(data_dir_path, columns=columns, batch_size=batch_size, cities=cities)
+    else:
+        yield from pd.read_csv(os.path.join(data_dir_path, LEGACY_CSV), usecols=lambda c: c in columns,
+                               dtype={c: "float64" for c in NUMERIC_FEATURES + [TARGET]}, chunksize=batch_size)
+
+
+def build_vocab(chunks):
+    """
+    First pass: sorted distinct labels of each category column over all chunks,
+    i.e. the codes encode_location_categories would fit on the whole dataset.
+    """
+    seen = {col: set() for col in CATEGORY_COLUMNS}
+    for df in chunks:
+        for col, labels in category_vocab(df).items():
+            seen[col].update(labels)
+    return {col: sorted(v) for col, v in seen.items()}
+
+
+def encode_chunk(df, vocab):
+    """X (FEATURES) and y of one chunk, categories encoded with a fixed vocab."""
+    df_vars = encode_location_categories(df, vocab)
+    return df_vars[FEATURES].astype("float64"), df_vars[TARGET].astype("float64")
+
+
+class StreamingLinearRegression:
+    """
+    Exact ordinary least squares over data seen in chunks. Keeps only the
+    count, means and centered cross-products (merged chunk by chunk, Chan et
+    al.'s pairwise update), so memory is O(features^2) whatever the row count.
+    The solution is the minimum-norm one, as LinearRegression's lstsq gives.
+    """
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.x_mean = np.zeros(n_features)
+        self.y_mean = 0.0
+        self.xx = np.zeros((n_features, n_features))
+        self.xy = np.zeros(n_features)
+
+    def partial_fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        m = len(y)
+        if not m:
+            return self
+        bx, by = X.mean(axis=0), y.mean()
+        Xc, yc = X - bx, y - by
+        dx, dy = bx - self.x_mean, by - self.y_mean
+        w = self.n * m / (self.n + m)
+        self.xx += Xc.T @ Xc + w * np.outer(dx, dx)
+        self.xy += Xc.T @ yc + w * dx * dy
+        self.n += m
+        self.x_mean += dx * m / self.n
+        self.y_mean += dy * m / self.n
+        return self
+
+    def to_model(self, feature_names=None):
+        """Solve and return a fitted LinearRegression (predict/pickle work as usual)."""
+        coef = np.linalg.pinv(self.xx, hermitian=True) @ self.xy
+        model = linear_model.LinearRegression()
+        model.coef_ = coef
+        model.intercept_ = float(self.y_mean - self.x_mean @ coef)
+        model.n_features_in_ = len(coef)
+        if feature_names is not None:
+            model.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        return model
+
+
+def train_streaming(data_dir_path, batch_size=100_000, cities=None):
+    """
+    Out-of-core fit of the same linear model as train(build_xy(...)): one pass
+    for the category vocab, one to accumulate the normal equations. Rows with
+    missing values are skipped (the in-memory fit rejects them).
+    """
+    vocab = build_vocab(iter_chunks(data_dir_path, batch_size, cities))
+    est = StreamingLinearRegression(len(FEATURES))
+    dropped = 0
+    for df in iter_chunks(data_dir_path, batch_size, cities):
+        X, y = encode_chunk(df, vocab)
+        ok = X.notna().all(axis=1).to_numpy() & y.notna().to_numpy()
+        dropped += int((~ok).sum())
+        est.partial_fit(X.to_numpy()[ok], y.to_numpy()[ok])
+        print(f'Accumulated {est.n} rows')
+    if dropped:
+        print(f'Skipped {dropped} rows with missing values')
+    model = est.to_model(FEATURES)
+    print("Regression coefficients:", model.coef_)
+    print("Intercept:", model.intercept_)
+    return model
+
+
 def train(X, y, model):
     if model is None:
-        model = LinearRegression().fit(X, y)
+        model = linear_model.LinearRegression().fit(X, y)
         print("Regression coefficients:", model.coef_)
         print("Intercept:", model.intercept_)
         return model
@@ -33,18 +153,71 @@ def train(X, y, model):
         return None
 
 
-def main():
+def main(argv=None):
     """
     Loads the model from csv file and retrieves X and y for model training
     """
-    X, y = build_xy(data_dir_path="/Users/rckyi/Documents/Data/")
+    parser = argparse.ArgumentParser(description="Train the revenue regression model")
+    parser.add_argument("--streaming", action="store_true",
+                        help="fit out of core in chunks (bounded memory, same coefficients)")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="rows per chunk with --streaming")
+    parser.add_argument("--search", action="store_true",
+                        help="rank estimators with spatially blocked CV, then fit the best one on all data")
+    parser.add_argument("--folds", type=int, default=5, help="spatial CV folds for --search")
+    parser.add_argument("--tile-m", type=float, default=1000, help="CV block size (m) for --search")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes for --search")
+    parser.add_argument("--publish", nargs="?", const=HF_MODEL_REPO, default=None, metavar="REPO",
+                        help=f"upload the .npz artifact to this Hugging Face model repo (default {HF_MODEL_REPO})")
+    args = parser.parse_args(argv)
 
-    model = train(X, y, None)
+    data_dir_path = "/Users/rckyi/Documents/Data/"
+    app_model = None  # what the .npz artifact gets when it can't be model itself
+    if args.search:
+        X, y, coords = build_xy(data_dir_path=data_dir_path, with_coords=True)
+        ok = X.notna().all(axis=1) & y.notna()  # not every estimator accepts missing values
+        X, y, coords = X[ok], y[ok], coords[ok]
+        report = model_search(X.to_numpy(), y.to_numpy(), coords["lat"], coords["lon"],
+                              n_folds=args.folds, tile_m=args.tile_m, workers=args.workers)
+        report.to_csv(os.path.join(data_dir_path, "model_search_report.csv"), index=False)
+        print(report[["rank", "config", "rmse_mean", "rmse_std", "r2_mean", "fit_seconds", "total_seconds"]]
+              .to_string(index=False))
+        model = best_estimator(report).fit(X, y)
+        print(f"Best configuration {report['config'].iat[0]} refit on {len(y)} rows")
+        # The app only serves linear artifacts: export the best linear configuration when the winner isn't one
+        linear = best_config(report, linear_only=True)
+        if linear is None:
+            raise RuntimeError("Model search: no linear configuration succeeded, the app artifact can't be updated")
+        if linear != report["config"].iat[0]:
+            app_model = best_estimator(report, linear_only=True).fit(X, y)
+            print(f"Best linear configuration {linear} refit for the app artifact")
+    elif args.streaming:
+        model = train_streaming(data_dir_path, batch_size=args.batch_size)
+    else:
+        X, y = build_xy(data_dir_path=data_dir_path)
+        model = train(X, y, None)
+    if app_model is None:
+        app_model = model
 
     filename = "/Users/rckyi/Documents/Data/linear_regression_model.pkl"
     with open(filename, 'wb') as file:
         pickle.dump(model, file)
 
+    # Lightweight artifact for the app: coefficients, feature order and category codes, no sklearn needed
+    vocab = build_vocab(iter_chunks(data_dir_path, args.batch_size, columns=CATEGORY_COLUMNS))
+    artifact_path = os.path.join(data_dir_path, "linear_regression_model.npz")
+    try:
+        export_linear_model(app_model, artifact_path, feature_names=FEATURES, vocab=vocab)
+    except ValueError:
+        # Never leave the previous model's artifact for InferenceApp to serve as if it were this one
+        if os.path.exists(artifact_path):
+            os.remove(artifact_path)
+        raise
+
+    if args.publish:
+        from huggingface_hub import HfApi
+        HfApi().upload_file(path_or_fileobj=artifact_path, path_in_repo=HF_MODEL_FILENAME, repo_id=args.publish,
+                            repo_type="model")
+        print(f'Published {artifact_path} to {args.publish}/{HF_MODEL_FILENAME}')
 
 
 
@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+import time
+from OFL.Helpers import tile_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tiles (
+    tile TEXT PRIMARY KEY,
+    city TEXT NOT NULL,
+    candidates TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS tiles_state ON tiles (state, tile);
+"""
+
+
+class TileQueue:
+    """
+    Pull-based work queue of candidate tiles in a single SQLite file.
+
+    Workers on any host that can open the file lease one tile at a time,
+    heartbeat while working, and mark it done. Leases that are not renewed
+    within lease_s are handed out again; tiles failing max_attempts times are
+    parked as 'failed'. Use wal=False when the file sits on a network
+    filesystem (WAL needs shared memory on one host).
+    """
+
+    def __init__(self, path, lease_s=600, max_attempts=3, wal=True):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        if wal:
+            self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.executescript(_SCHEMA)
+
+    def _tx(self, fn):
+        """Run fn(cursor) in an immediate (write-locking) transaction."""
+        with self._lock:
+            cur = self._con.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(cur)
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+            return result
+
+    def enqueue(self, candidates_by_city, tile_m=1000):
+        """Add candidates grouped into tiles; tiles already in the queue are left alone. Returns tiles added."""
+        tiles = {}
+        for city, candidates in candidates_by_city.items():
+            for lat, lon in candidates:
+                i, j = tile_id(lat, lon, tile_m)
+                tiles.setdefault(f"{city}|{i}|{j}", (city, []))[1].append((lat, lon))
+
+        def insert(cur):
+            before = cur.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+            cur.executemany(
+                "INSERT OR IGNORE INTO tiles (tile, city, candidates, updated) VALUES (?, ?, ?, ?)",
+                [(t, city, json.dumps(pts), time.time()) for t, (city, pts) in sorted(tiles.items())],
+            )
+            return cur.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] - before
+
+        return self._tx(insert)
+
+    def _requeue_expired(self, cur, now):
+        # A tile that keeps killing its worker (OOM, segfault, hang) is parked like one that raises
+        cur.execute(
+            "UPDATE tiles SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, lease_expires = NULL, "
+            "error = CASE WHEN attempts >= ? THEN 'lease expired' ELSE error END, updated = ? "
+            "WHERE state = 'leased' AND lease_expires < ?",
+            (self.max_attempts, self.max_attempts, now, now),
+        )
+        return cur.rowcount
+
+    def requeue_expired(self):
+        """
+        Return tiles whose lease ran out to the pending pool ('failed' once
+        they have used max_attempts). Returns the number of expired leases.
+        """
+        return self._tx(lambda cur: self._requeue_expired(cur, time.time()))
+
+    def lease(self, worker_id):
+        """Lease the next pending tile. Returns (tile, city, candidates) or None when nothing is pending."""
+
+        def take(cur):
+            now = time.time()
+            self._requeue_expired(cur, now)
+            row = cur.execute(
+                "SELECT tile, city, candidates FROM tiles WHERE state = 'pending' ORDER BY tile LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                "UPDATE tiles SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated = ? WHERE tile = ?",
+                (worker_id, now + self.lease_s, now, row[0]),
+            )
+            return row[0], row[1], [tuple(p) for p in json.loads(row[2])]
+
+        return self._tx(take)
+
+    def heartbeat(self, tile, worker_id):
+        """Extend the lease. Returns False if the worker no longer owns the tile."""
+
+        def renew(cur):
+            now = time.time()
+            cur.execute(
+                "UPDATE tiles SET lease_expires = ?, updated = ? WHERE tile = ? AND owner = ? AND state = 'leased'",
+                (now + self.lease_s, now, tile, worker_id),
+            )
+            return cur.rowcount == 1
+
+        return self._tx(renew)
+
+    def complete(self, tile, worker_id):
+        """Mark a leased tile done. Returns False if the lease was lost (the tile may be redone elsewhere)."""
+
+        def done(cur):
+            cur.execute(
+                "UPDATE tiles SET state = 'done', lease_expires = NULL, error = NULL, updated = ? "
+                "WHERE tile = ? AND owner = ? AND state = 'leased'",
+                (time.time(), tile, worker_id),
+            )
+            return cur.rowcount == 1
+
+        return self._tx(done)
+
+    def release(self, tile, worker_id, error=None):
+        """Give a tile back after a failure; it becomes 'failed' after max_attempts."""
+
+        def back(cur):
+            cur.execute(
+                "UPDATE tiles SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE tile = ? AND owner = ? AND state = 'leased'",
+                (self.max_attempts, error, time.time(), tile, worker_id),
+            )
+
+        self._tx(back)
+
+    def counts(self):
+        """Number of tiles per state."""
+        with self._lock:
+            return dict(self._con.execute("SELECT state, COUNT(*) FROM tiles GROUP BY state").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+
+class Heartbeat:
+    """Background thread renewing a tile lease every interval seconds until stopped."""
+
+    def __init__(self, queue, tile, worker_id, interval):
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(queue, tile, worker_id, interval), daemon=True)
+        self._thread.start()
+
+    def _run(self, queue, tile, worker_id, interval):
+        while not self._stop.wait(interval):
+            try:
+                if not queue.heartbeat(tile, worker_id):
+                    print(f'Lost lease on tile {tile}')
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                print(f'Heartbeat failed for tile {tile}: {e}')
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,28 @@
+from OFL.Cache import BoundedCache, memoize
+
+
+def test_memoize_skips_uncacheable_results_and_copies_hits():
+    calls = []
+    responses = [{"error": {"code": 500}}, {"features": [1]}, {"features": [2]}]
+
+    @memoize(BoundedCache("test.memoize", max_entries=10), cacheable=lambda v: "error" not in v, copy_hits=True)
+    def fetch(url):
+        calls.append(url)
+        return responses[len(calls) - 1]
+
+    assert "error" in fetch("a")
+    first = fetch("a")  # the error was not cached, so this refetches
+    assert first == {"features": [1]}
+    first["features"].append("mutated")
+    assert fetch("a") == {"features": [1]}
+    assert fetch("a") is not fetch("a")
+    assert calls == ["a", "a"]
+
+
+def test_max_bytes_counts_deeply_nested_values():
+    cache = BoundedCache("test.nested", max_bytes=50_000)
+    page = {"features": [{"attributes": {"values": [str(i) * 1000 for i in range(10)]}}]}  # ~10 kB five levels down
+    for i in range(10):
+        cache.set(i, page)
+    assert cache.stats()["bytes"] <= 50_000
+    assert len(cache) < 10
@@ -0,0 +1,46 @@
+import pytest
+from OFL import Gazetteer
+from OFL.Helpers import _GAZETTEER_MAX_DISTANCE_M
+from OFL.Runners.CollectRevenueData.CountyAdapters import COUNTY_ADAPTERS
+
+# Points near the edges of each labeled county, away from its main city
+COUNTY_EDGE_POINTS = {
+    "nyc": [(40.50, -74.24), (40.90, -73.78)],
+    "la": [(34.80, -118.70), (34.60, -117.70), (33.40, -118.40), (34.05, -118.85)],
+    "cook": [(42.15, -88.24), (41.47, -87.55), (41.70, -88.05)],
+    "harris": [(30.10, -95.90), (29.55, -95.00), (30.05, -95.05)],
+    "maricopa": [(32.95, -112.90), (33.95, -113.20), (33.85, -111.45), (33.20, -111.60)],
+    "king": [(47.20, -122.00), (47.70, -121.30), (47.40, -121.45), (47.40, -122.50)],
+}
+
+# GeoNames dump columns: id, name, asciiname, alternatenames, lat, lon, class, code,
+# country, cc2, admin1, admin2, admin3, admin4, population, ...
+_GEONAMES_ROWS = [
+    ["5703673", "Ely", "Ely", "", "39.24744", "-114.88863", "P", "PPLA2", "US", "", "NV", "033", "", "", "4255"],
+    ["5697939", "Reno", "Reno", "", "39.52963", "-119.8138", "P", "PPLA2", "US", "", "NV", "031", "", "", "241445"],
+    ["5701397", "Great Basin", "Great Basin", "", "38.98", "-114.30", "L", "PRK", "US", "", "NV", "", "", "", "0"],
+    ["6077243", "Montreal", "Montreal", "", "45.50884", "-73.58781", "P", "PPLA2", "CA", "", "10", "", "", "", "1600000"],
+]
+
+
+def test_every_labeled_county_is_covered():
+    assert set(COUNTY_EDGE_POINTS) == set(COUNTY_ADAPTERS)
+    gaz = Gazetteer.load_gazetteer()
+    for county, points in COUNTY_EDGE_POINTS.items():
+        for lat, lon in points:
+            idx, dist = gaz.nearest(lat, lon, _GAZETTEER_MAX_DISTANCE_M)
+            assert idx >= 0, f"{county} point {(lat, lon)} is {dist / 1000:.0f} km from the nearest place"
+
+
+def test_geonames_build_answers_lookups_outside_the_bundled_counties(tmp_path):
+    dump = tmp_path / "cities1000.txt"
+    dump.write_text("".join("\t".join(row) + "\n" for row in _GEONAMES_ROWS), encoding="utf-8")
+    out = Gazetteer.build_gazetteer_from_geonames(str(dump), str(tmp_path / "places.csv"))
+    gaz = Gazetteer.load_gazetteer(out)
+
+    assert list(gaz.names) == ["Ely", "Reno"]  # only US populated places
+    assert list(gaz.places) == ["city", "city"]  # admin seats count as cities
+    # A ranch road outside Ely, NV: nowhere near the bundled file, found in the built one
+    assert Gazetteer.load_gazetteer().nearest_coords(39.30, -114.95, _GAZETTEER_MAX_DISTANCE_M) is None
+    assert gaz.nearest_coords(39.30, -114.95, _GAZETTEER_MAX_DISTANCE_M) == pytest.approx((39.24744, -114.88863))
+    assert gaz.nearest_coords(37.0, -117.0, _GAZETTEER_MAX_DISTANCE_M) is None
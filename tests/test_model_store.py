@@ -0,0 +1,127 @@
+import http.server
+import os
+import threading
+import pytest
+import requests
+from OFL import Http
+from OFL.ModelStore import ModelStore
+
+
+class _Remote:
+    """What the stand-in server serves: body, ETag, status override, and a log of requests."""
+
+    def __init__(self):
+        self.body = b"model-v1"
+        self.etag = '"v1"'
+        self.status = None
+        self.requests = []
+
+
+def _handler(remote):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            inm = self.headers.get("If-None-Match")
+            remote.requests.append(inm)
+            if remote.status is not None:
+                self.send_response(remote.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif inm == remote.etag:
+                self.send_response(304)
+                self.send_header("ETag", remote.etag)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header("ETag", remote.etag)
+                self.send_header("Content-Length", str(len(remote.body)))
+                self.end_headers()
+                self.wfile.write(remote.body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def server():
+    remote = _Remote()
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _handler(remote))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    saved = dict(Http._config)
+    # No retries: a 5xx should reach the fallback immediately
+    Http.configure(retries=0, cache_dir=None)
+    remote.url = f"http://127.0.0.1:{httpd.server_address[1]}/model.npz"
+    remote.httpd = httpd
+    yield remote
+    httpd.shutdown()
+    httpd.server_close()
+    Http.configure(**saved)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_first_fetch_stores_object(server, tmp_path):
+    store = ModelStore(str(tmp_path))
+    path = store.fetch("repo/model.npz", server.url)
+    assert _read(path) == b"model-v1"
+    digest = os.path.basename(path)
+    assert store.verify(digest)
+    assert store.get_ref("repo/model.npz")["etag"] == '"v1"'
+    assert server.requests == [None]
+
+
+def test_unchanged_remote_revalidates_without_download(server, tmp_path):
+    store = ModelStore(str(tmp_path))
+    first = store.fetch("repo/model.npz", server.url)
+    mtime = os.path.getmtime(first)
+    second = store.fetch("repo/model.npz", server.url)
+    assert second == first
+    assert os.path.getmtime(second) == mtime
+    assert server.requests == [None, '"v1"']
+    assert len(os.listdir(store.objects_dir)) == 1
+
+
+def test_changed_etag_creates_new_object(server, tmp_path):
+    store = ModelStore(str(tmp_path))
+    first = store.fetch("repo/model.npz", server.url)
+    server.body, server.etag = b"model-v2", '"v2"'
+    second = store.fetch("repo/model.npz", server.url)
+    assert second != first
+    assert _read(first) == b"model-v1"  # objects are never modified
+    assert _read(second) == b"model-v2"
+    assert store.get_ref("repo/model.npz")["etag"] == '"v2"'
+    assert store.prune() == 1
+
+
+def test_server_error_falls_back_to_last_good(server, tmp_path):
+    store = ModelStore(str(tmp_path))
+    first = store.fetch("repo/model.npz", server.url)
+    server.status = 503
+    assert store.fetch("repo/model.npz", server.url) == first
+
+
+def test_offline_falls_back_to_last_good(server, tmp_path):
+    store = ModelStore(str(tmp_path))
+    first = store.fetch("repo/model.npz", server.url)
+    server.httpd.shutdown()
+    server.httpd.server_close()
+    assert store.fetch("repo/model.npz", server.url) == first
+
+
+def test_client_error_is_raised(server, tmp_path):
+    store = ModelStore(str(tmp_path))
+    store.fetch("repo/model.npz", server.url)
+    server.status = 404
+    with pytest.raises(requests.HTTPError):
+        store.fetch("repo/model.npz", server.url)
+
+
+def test_error_without_cached_version_is_raised(server, tmp_path):
+    server.status = 503
+    with pytest.raises(requests.RequestException):
+        ModelStore(str(tmp_path)).fetch("repo/model.npz", server.url)
@@ -0,0 +1,48 @@
+import threading
+import time
+import numpy as np
+from OFL.ModelArtifact import LinearPredictor
+from OFL.Runners import Ranking
+
+
+def _slow_features(calls, delay=0.05):
+    lock = threading.Lock()
+
+    def features(lat, lon, *args):
+        with lock:
+            calls.append((lat, lon))
+        time.sleep(delay)
+        return {c: float(lat) for c in Ranking.FEATURE_COLUMNS}
+
+    return features
+
+
+def _model():
+    coef = np.zeros(len(Ranking.FEATURE_COLUMNS))
+    coef[0] = 1.0
+    return LinearPredictor(coef, 0.0, Ranking.FEATURE_COLUMNS)
+
+
+def test_closing_rank_candidates_early_returns_promptly(monkeypatch):
+    calls = []
+    monkeypatch.setattr(Ranking, "aggregate_location_features", _slow_features(calls))
+    monkeypatch.setattr(Ranking, "_thread_cursor", lambda con, local: None)
+    candidates = [(float(i), 0.0) for i in range(200)]
+    gen = Ranking.rank_candidates(candidates, _model(), k=5, batch_size=4, max_workers=4, _fsq_query_cache={})
+    next(gen)
+    start = time.time()
+    gen.close()
+    # Only the bounded in-flight window may still finish, not the remaining ~190 candidates
+    assert time.time() - start < 0.5
+    time.sleep(0.2)
+    assert len(calls) < 40
+
+
+def test_rank_candidates_final_ranking_covers_all_candidates(monkeypatch):
+    monkeypatch.setattr(Ranking, "aggregate_location_features", _slow_features([], delay=0))
+    monkeypatch.setattr(Ranking, "_thread_cursor", lambda con, local: None)
+    candidates = [(float(i), 0.0) for i in range(50)]
+    *_, (done, total, top) = Ranking.rank_candidates(candidates, _model(), k=3, batch_size=8,
+                                                     _fsq_query_cache={})
+    assert (done, total) == (50, 50)
+    assert top["lat"].tolist() == [49.0, 48.0, 47.0]